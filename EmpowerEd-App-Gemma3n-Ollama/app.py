@@ -18,191 +18,2698 @@ import speech_recognition as sr
 import pyttsx3
 import threading
 import queue
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import os
+import re
+import sys
+import sqlite3
+import hashlib
+import hmac
+import uuid
+import logging
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-engine = pyttsx3.init('nsss') 
+logger = logging.getLogger("empowered")
 
-class EmpowerEdAssistant:
-    def __init__(self):
-        self.fast_model = "gemma3n:e2b"
-        self.accurate_model = "empowered-gemma-3n-2b-q8:latest"
-        self.vision_model = "gemma3n:e4b"
-        self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|\n+')
+
+def split_sentences(text):
+    """Split text into speakable sentences, dropping markdown symbols"""
+    sentences = []
+    for sentence in SENTENCE_BREAK.split(text):
+        sentence = re.sub(r'[*#_`>|]+', '', sentence).strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+def chunk_paragraphs(text, max_chars=1500):
+    """Group paragraphs into chunks of at most max_chars, splitting only at paragraph breaks.
+    
+    A single paragraph longer than max_chars is split at sentence boundaries instead.
+    """
+    chunks = []
+    current = ""
+    
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        
+        pieces = [paragraph]
+        if len(paragraph) > max_chars:
+            pieces = []
+            for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+                if pieces and len(pieces[-1]) + len(sentence) + 1 <= max_chars:
+                    pieces[-1] += " " + sentence
+                else:
+                    pieces.append(sentence)
+        
+        for piece in pieces:
+            if current and len(current) + len(piece) + 2 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    
+    if current:
+        chunks.append(current)
+    return chunks
+
+class NullSpeechEngine:
+    """Silent stand-in for headless servers without an audio device"""
+    
+    def say(self, text):
+        pass
+    
+    def runAndWait(self):
+        pass
+    
+    def stop(self):
+        pass
+
+def default_tts_driver():
+    """pyttsx3 driver for this platform, overridable with EMPOWERED_TTS_DRIVER"""
+    driver = os.environ.get("EMPOWERED_TTS_DRIVER")
+    if driver:
+        return driver
+    if sys.platform == "darwin":
+        return "nsss"
+    if sys.platform == "win32":
+        return "sapi5"
+    return "espeak"
+
+def create_speech_engine(driver_name):
+    """Create a pyttsx3 engine, falling back to silence if the driver is unavailable"""
+    if driver_name == "null":
+        return NullSpeechEngine()
+    
+    try:
+        return pyttsx3.init(driver_name)
+    except Exception as e:
+        print(f"Text-to-speech driver '{driver_name}' not available, audio disabled: {e}")
+        return NullSpeechEngine()
+
+class SpeechWorker:
+    """Speaks queued sentences on a dedicated thread so the UI never waits on audio.
+    
+    The thread and the audio engine are only created the first time something is spoken.
+    Every session shares the worker, so sentences carry the session that queued them
+    and stop/skip only affect that session's speech.
+    """
+    
+    def __init__(self, driver_name=None):
+        self.driver_name = driver_name or default_tts_driver()
+        self._queue = queue.Queue()
+        # stop() bumps the session's generation so sentences it queued before are dropped
+        self._generations = {}
+        self._current = None
+        self._engine = None
+        self._speaking = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+    
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="empowered-tts", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        # pyttsx3 engines must be driven from the thread that created them
+        self._engine = create_speech_engine(self.driver_name)
         
-        self.student_profile = self.load_saved_profile()
+        while True:
+            session, generation, sentence = self._queue.get()
+            if generation != self._generations.get(session, 0):
+                continue
+            
+            self._current = session
+            self._speaking.set()
+            try:
+                self._engine.say(sentence)
+                self._engine.runAndWait()
+            except Exception as e:
+                print(f"Text-to-speech failed: {e}")
+            finally:
+                self._speaking.clear()
+    
+    def say(self, text, session=None):
+        """Queue text for speaking; the first sentence starts right away"""
+        self._ensure_started()
+        for sentence in split_sentences(text):
+            self._queue.put((session, self._generations.get(session, 0), sentence))
+    
+    def speak_stream(self, tokens, session=None):
+        """Pass tokens through unchanged, speaking each sentence as soon as it is complete"""
+        pending = ""
+        for token in tokens:
+            pending += token
+            parts = SENTENCE_BREAK.split(pending)
+            if len(parts) > 1:
+                self.say(" ".join(parts[:-1]), session)
+                pending = parts[-1]
+            yield token
+        
+        if pending.strip():
+            self.say(pending, session)
+    
+    def skip(self, session=None):
+        """Cut the session's current sentence short and move on to the next one"""
+        if self._engine is not None and self._speaking.is_set() and self._current == session:
+            self._engine.stop()
+    
+    def stop(self, session=None):
+        """Stop the session's speech and drop everything it still has queued"""
+        self._generations[session] = self._generations.get(session, 0) + 1
+        self.skip(session)
+    
+    def is_busy(self):
+        return self._speaking.is_set() or not self._queue.empty()
+
+speech = SpeechWorker()
+
+def speech_session():
+    """This browser session's key for the shared speech worker"""
+    if "speech_session" not in st.session_state:
+        st.session_state.speech_session = uuid.uuid4().hex
+    return st.session_state.speech_session
+
+# Gemma 3n's vision encoder works natively at 256, 512 or 768 px; larger photos only cost encode time
+VISION_INPUT_SIZE = 768
+
+def preprocess_image(image, max_side=VISION_INPUT_SIZE, quality=85):
+    """Downscale an image for the vision model and re-encode it as compact JPEG.
+    
+    Returns the JPEG bytes and a perceptual hash of the picture.
+    """
+    pixels = np.array(image.convert("RGB"))
+    height, width = pixels.shape[:2]
     
-    def load_saved_profile(self):
-        """Load saved profile or return defaults"""
+    scale = max_side / max(height, width)
+    if scale < 1:
+        pixels = cv2.resize(
+            pixels,
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA
+        )
+    
+    ok, encoded = cv2.imencode(
+        ".jpg",
+        cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR),
+        [cv2.IMWRITE_JPEG_QUALITY, quality]
+    )
+    if not ok:
+        raise ValueError("Could not encode image as JPEG")
+    
+    return encoded.tobytes(), perceptual_hash(pixels)
+
+def perceptual_hash(pixels):
+    """64-bit difference hash; near-identical photos differ in only a few bits"""
+    gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+def hamming_distance(hash_a, hash_b):
+    return bin(hash_a ^ hash_b).count("1")
+
+ADAPTATION_GUIDES = {
+    "dyslexia": {
+        "intro": "Reformat this text for a student with dyslexia:",
+        "rules": [
+            "Use simple, clear sentences (max 10 words each)",
+            "Break into small paragraphs (2-3 sentences max)",
+            "Put **key words** in bold",
+            "Add bullet points where helpful",
+            "Use active voice only"
+        ],
+        "label": "Text",
+        "closing": "Output the reformatted text with clear structure."
+    },
+    "adhd": {
+        "intro": "Reformat this content for a student with ADHD:",
+        "rules": [
+            "Break into bite-sized chunks (50 words max per section)",
+            "Add 🎯 emoji markers for important points",
+            "Include \"Brain Break!\" reminders every 3 sections",
+            "Use exciting, engaging language",
+            "Add interactive prompts like \"Think about this!\""
+        ],
+        "label": "Content",
+        "closing": "Make it super engaging and easy to focus on."
+    },
+    "autism": {
+        "intro": "Adapt this content for a student with autism:",
+        "rules": [
+            "Use clear, literal language (no metaphors or idioms)",
+            "Number each step or point clearly",
+            "Include predictable structure with headers",
+            "Be very specific and concrete",
+            "Add \"What comes next:\" transitions"
+        ],
+        "label": "Content",
+        "closing": "Make it structured and predictable."
+    },
+    "general": {
+        "intro": "Simplify this text for easier understanding:",
+        "rules": [
+            "Use simple words (grade 3-4 level)",
+            "Short sentences (10 words or less)",
+            "Explain any hard words",
+            "Add helpful examples"
+        ],
+        "label": "Text",
+        "closing": "Make it very easy to understand."
+    }
+}
+
+# Every prompt is a fixed instruction prefix, sent as the system prompt, followed
+# by the per-call content. Calls that share a template share an identical
+# prefix, which Ollama can reuse from a loaded model's KV cache instead of
+# evaluating it again, so nothing that varies may appear in "system".
+PROMPT_TEMPLATES = {
+    "combined": {
+        "system": "Adapt content for a student with {needs}.\n"
+                  "Follow all of these rules together:\n"
+                  "{rules}\n"
+                  "Output one adapted version that works for all of these needs.",
+        "user": "Content: {text}"
+    },
+    "image_description": {
+        "system": "Describe the image for a special needs student.\n"
+                  "Be simple, clear, and encouraging.",
+        "user": "The student is learning about: {objective}"
+    },
+    "image_guide": {
+        "system": "Look at the image and create a special needs learning guide.\n"
+                  "\n"
+                  "Include:\n"
+                  "1. 📸 What We See (simple description)\n"
+                  "2. 📚 Learning Points (3-5 bullet points)\n"
+                  "3. 🌍 Real World Examples (2-3 examples)\n"
+                  "4. ❓ Check Understanding (2 simple questions)\n"
+                  "5. 🎨 Fun Activity (1 hands-on activity)\n"
+                  "\n"
+                  "Use very simple language and be encouraging!",
+        "user": "Learning objective: {objective}"
+    },
+    "visual_guide": {
+        "system": "Create a special needs learning guide based on a description of an image.\n"
+                  "\n"
+                  "Include:\n"
+                  "1. 📸 What We See (simple description)\n"
+                  "2. 📚 Learning Points (3-5 bullet points)\n"
+                  "3. 🌍 Real World Examples (2-3 examples)\n"
+                  "4. ❓ Check Understanding (2 simple questions)\n"
+                  "5. 🎨 Fun Activity (1 hands-on activity)\n"
+                  "\n"
+                  "Use very simple language and be encouraging!",
+        "user": "Learning objective: {objective}\nImage: {description}"
+    },
+    "educational_content": {
+        "system": "Create an engaging educational guide for special needs students about the topic given.\n"
+                  "\n"
+                  "Structure:\n"
+                  "1. 🎯 What is it? (super simple explanation)\n"
+                  "2. 📚 Key Things to Know (3-5 points with emojis)\n"
+                  "3. 🌍 Where We See It (real-life examples)\n"
+                  "4. ❓ Quick Check (2 yes/no questions)\n"
+                  "5. 🎮 Fun Activity (something hands-on)\n"
+                  "\n"
+                  "Remember: Very simple language, lots of encouragement, use emojis!",
+        "user": "Topic: {objective}"
+    },
+    "lesson": {
+        "system": "Create a multi-sensory lesson plan for the topic and student given.\n"
+                  "\n"
+                  "Structure the lesson with these sections:\n"
+                  "\n"
+                  "🎯 LESSON GOAL\n"
+                  "- One clear, simple learning objective\n"
+                  "\n"
+                  "👀 VISUAL ACTIVITIES\n"
+                  "- 2-3 things to look at or draw\n"
+                  "- Simple, clear instructions\n"
+                  "\n"
+                  "👂 AUDIO ELEMENTS\n"
+                  "- Sounds or songs related to the topic\n"
+                  "- Rhythm or rhyme to remember key facts\n"
+                  "\n"
+                  "🤸 MOVEMENT ACTIVITIES\n"
+                  "- 2-3 physical activities\n"
+                  "- Include \"Simon Says\" style games\n"
+                  "\n"
+                  "📝 SIMPLE EXPLANATIONS\n"
+                  "- Key facts in 5 words or less\n"
+                  "- Use comparisons to familiar things\n"
+                  "\n"
+                  "🎮 INTERACTIVE CHECKPOINTS\n"
+                  "- \"Show me\" activities\n"
+                  "- Yes/no understanding checks\n"
+                  "\n"
+                  "😴 SENSORY BREAKS\n"
+                  "- When: every 5-7 minutes\n"
+                  "- What: stretching, deep breathing, or quiet time\n"
+                  "\n"
+                  "Make everything super engaging and appropriate for the student's needs!",
+        "user": "Student has: {needs}\nLevel: {level}\nTopic: {topic}"
+    },
+    "comprehension_questions": {
+        "system": "Create 3 simple comprehension questions about the text given.\n"
+                  "\n"
+                  "Requirements:\n"
+                  "- Use yes/no or multiple choice format\n"
+                  "- Very simple language\n"
+                  "- Test basic understanding only\n"
+                  "- Include encouraging feedback options\n"
+                  "\n"
+                  "Format as:\n"
+                  "Q1: [Question]\n"
+                  "Options: a) ... b) ... c) ... d) ...\n"
+                  "Correct: [letter]\n"
+                  "\n"
+                  "Make them appropriate for special needs students.",
+        "user": "Text:\n{text}"
+    },
+    "summary": {
+        "system": "Summarize the text so questions can still be asked about it.\n"
+                  "Keep every key fact, name and number.\n"
+                  "Use short, plain sentences.",
+        "user": "Text:\n{text}"
+    },
+    "practice_questions": {
+        "system": "Create practice questions about the topic given.\n"
+                  "\n"
+                  "Return a JSON object with exactly the number of questions asked for:\n"
+                  "{\"questions\": [{\n"
+                  "    \"question\": \"Simple question text\",\n"
+                  "    \"type\": \"multiple_choice\",\n"
+                  "    \"options\": [\"Option A\", \"Option B\", \"Option C\", \"Option D\"],\n"
+                  "    \"correct_answer\": \"Option A\",\n"
+                  "    \"feedback\": \"Try again! Hint: ...\",\n"
+                  "    \"success_message\": \"Great job! You got it!\"\n"
+                  "}]}\n"
+                  "\n"
+                  "The correct_answer must be exactly one of the options.\n"
+                  "Make questions fun, encouraging, and appropriate for special needs students.",
+        "user": "Adaptations needed: {adaptations}\nDifficulty: {difficulty}\nNumber of questions: {count}\n"
+                "{avoid}Topic: {topic}"
+    }
+}
+
+def numbered(items):
+    return "\n".join(f"{i}. {item}" for i, item in enumerate(items, 1))
+
+for _disability, _guide in ADAPTATION_GUIDES.items():
+    PROMPT_TEMPLATES[f"adapt:{_disability}"] = {
+        "system": f"{_guide['intro']}\n{numbered(_guide['rules'])}\n{_guide['closing']}",
+        "user": _guide["label"] + ": {text}"
+    }
+
+def prompt_chars(request):
+    """Characters of instructions and content in a generate or chat request"""
+    if "messages" in request:
+        return sum(len(message["content"]) for message in request["messages"])
+    return len(request.get("system", "")) + len(request["prompt"])
+
+def render_prompt(name, **fields):
+    """Return (system, prompt) for a registered template, with fields only in the prompt"""
+    template = PROMPT_TEMPLATES[name]
+    return template["system"], template["user"].format(**fields)
+
+def adaptation_prompt(disabilities, text):
+    """(system, prompt) adapting text for one or several known disability profiles"""
+    if len(disabilities) == 1:
+        return render_prompt(f"adapt:{disabilities[0]}", text=text)
+    
+    name = "adapt:" + "+".join(disabilities)
+    if name not in PROMPT_TEMPLATES:
+        merged_rules = []
+        for disability in disabilities:
+            for rule in ADAPTATION_GUIDES[disability]["rules"]:
+                if rule not in merged_rules:
+                    merged_rules.append(rule)
+        PROMPT_TEMPLATES[name] = {
+            "system": PROMPT_TEMPLATES["combined"]["system"].format(
+                needs=", ".join(disabilities), rules=numbered(merged_rules)
+            ),
+            "user": PROMPT_TEMPLATES["combined"]["user"]
+        }
+    return render_prompt(name, text=text)
+
+class ResponseCache:
+    """Persistent cache of model responses keyed on (model, rendered prompt, options)"""
+    
+    def __init__(self, path="response_cache.db", max_entries=5000, max_bytes=64 * 1024 * 1024,
+                 ttl_seconds=7 * 24 * 3600, cache_sampled=True):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # Sampled (temperature > 0) responses differ on every run; teachers can opt out of reusing them
+        self.cache_sampled = cache_sampled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self._db.commit()
+    
+    def make_key(self, model, request, options=None):
+        """Hash the model, rendered request and sampling options into a cache key"""
+        def encode(value):
+            if isinstance(value, bytes):
+                return hashlib.sha256(value).hexdigest()
+            return str(value)
+        
+        payload = json.dumps(
+            {"model": model, "request": request, "options": options or {}},
+            sort_keys=True,
+            default=encode
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def should_cache(self, options=None):
+        """Deterministic requests are always cached, sampled ones only when allowed"""
+        if self.cache_sampled:
+            return True
+        # Ollama samples at temperature 0.8 unless told otherwise
+        return (options or {}).get("temperature", 0.8) == 0
+    
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+    
+    def put(self, key, model, response):
+        """Store a response and evict expired or least recently used entries"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now)
+            )
+            self._evict(now)
+            self._db.commit()
+    
+    def _evict(self, now):
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        
+        entries, size = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        
+        while entries > self.max_entries or size > self.max_bytes:
+            excess = max(entries - self.max_entries, 1)
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+    
+    def clear(self):
+        """Remove every cached response"""
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+    
+    def stats(self):
+        """Hit/miss counters plus the current size of the cache"""
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size
+        }
+
+class SemanticCache:
+    """Reuses answers for requests that mean the same thing, like "fractions" and "what are fractions".
+    
+    Each entry keeps an embedding of its query (a lesson topic)
+    from an Ollama embedding model. Lookups only match inside their scope,
+    e.g. the task, disability profile and difficulty, and only when the cosine
+    similarity reaches the scope's task threshold. The index is one normalized
+    numpy matrix per scope, rebuilt from SQLite on start. The seconds each
+    answer took to generate are kept, so a hit knows the time it saved.
+    """
+    
+    def __init__(self, embed, path="semantic_cache.db", thresholds=None, default_threshold=0.9,
+                 max_entries=500, ttl_seconds=7 * 24 * 3600, retry_seconds=300):
+        self.embed = embed
+        self.path = path
+        self.thresholds = dict(thresholds or {})
+        self.default_threshold = default_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self.lookups = 0
+        self.hits = 0
+        self.seconds_saved = 0.0
+        self._unavailable_until = 0.0
+        self._index = {}
+        self._lock = threading.Lock()
+        
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                response TEXT NOT NULL,
+                seconds REAL NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_semantic_scope ON semantic_entries(scope, created)")
+        self._db.execute("DELETE FROM semantic_entries WHERE created < ?", (time.time() - self.ttl_seconds,))
+        self._db.commit()
+        
+        for entry_id, scope, blob, response, seconds in self._db.execute(
+            "SELECT id, scope, embedding, response, seconds FROM semantic_entries ORDER BY id"
+        ):
+            self._add(scope, entry_id, np.frombuffer(blob, dtype=np.float32), response, seconds)
+    
+    def scope_key(self, scope):
+        return "|".join(str(part or "-") for part in scope)
+    
+    def _add(self, key, entry_id, vector, response, seconds):
+        ids, matrix, answers = self._index.get(key, ([], None, []))
+        if matrix is not None and matrix.shape[1] != vector.shape[0]:
+            # The embedding model changed; older vectors can't be compared with new ones
+            ids, matrix, answers = [], None, []
+        ids.append(entry_id)
+        answers.append((response, seconds))
+        matrix = vector[None, :] if matrix is None else np.vstack([matrix, vector])
+        self._index[key] = (ids[-self.max_entries:], matrix[-self.max_entries:], answers[-self.max_entries:])
+    
+    def vector(self, text):
+        """The normalized embedding of text, or None while the embedding model is unavailable"""
+        if time.time() < self._unavailable_until:
+            return None
         try:
-            with open("student_profile.json", "r") as f:
-                return json.load(f)
-        except FileNotFoundError:
+            vector = np.asarray(self.embed(text), dtype=np.float32)
+        except Exception as e:
+            print(f"Semantic cache off for {self.retry_seconds}s, embedding failed: {e}")
+            self._unavailable_until = time.time() + self.retry_seconds
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+    
+    def lookup(self, scope, query):
+        """(cached answer or None, query embedding) for the closest earlier query in scope"""
+        start = time.time()
+        vector = self.vector(query)
+        key = self.scope_key(scope)
+        threshold = self.thresholds.get(scope[0], self.default_threshold)
+        
+        with self._lock:
+            self.lookups += 1
+            _, matrix, answers = self._index.get(key, ([], None, []))
+            if vector is None or matrix is None or matrix.shape[1] != vector.shape[0]:
+                return None, vector
+            
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < threshold:
+                return None, vector
+            
+            response, seconds = answers[best]
+            self.hits += 1
+            self.seconds_saved += max(seconds - (time.time() - start), 0.0)
+        
+        logger.info("%s: '%s' matched an earlier request (%.2f)", scope[0], query[:40], scores[best])
+        return response, vector
+    
+    def put(self, scope, query, vector, response, seconds):
+        """Remember response for query; vector is the embedding lookup returned"""
+        if vector is None or not response:
+            return
+        key = self.scope_key(scope)
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO semantic_entries (scope, query, embedding, response, seconds, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, query, vector.astype(np.float32).tobytes(), response, seconds, time.time())
+            )
+            self._db.execute(
+                "DELETE FROM semantic_entries WHERE scope = ? AND id NOT IN "
+                "(SELECT id FROM semantic_entries WHERE scope = ? ORDER BY id DESC LIMIT ?)",
+                (key, key, self.max_entries)
+            )
+            self._db.commit()
+            self._add(key, cursor.lastrowid, vector.astype(np.float32), response, seconds)
+    
+    def clear(self):
+        """Forget every entry"""
+        with self._lock:
+            self._db.execute("DELETE FROM semantic_entries")
+            self._db.commit()
+            self._index = {}
+    
+    def stats(self):
+        with self._lock:
             return {
-                "reading_speed": "slow",
-                "visual_preference": "normal",
-                "audio_preference": True,
-                "attention_span": 10,
-                "learning_style": "visual",
-                "disabilities": []
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "seconds_saved": round(self.seconds_saved, 1),
+                "entries": sum(len(ids) for ids, _, _ in self._index.values())
             }
+
+DISABILITY_OPTIONS = ["Dyslexia", "ADHD", "Autism", "Visual Impairment", "Hearing Impairment", "Motor Difficulties"]
+
+LESSON_DIFFICULTIES = ["Beginner", "Easy", "Medium", "Challenging"]
+
+STARTER_TOPICS = ["numbers 1-10", "colors", "emotions", "animals"]
+
+class LessonLibrary:
+    """Lessons, practice questions and comprehension questions generated ahead of class.
+    
+    build_library.py fills it overnight for a list of topics across every
+    disability combination and difficulty level. Entries are keyed on (kind,
+    topic, needs, difficulty), so a class-time lookup is one primary-key read;
+    anything not in the library is generated live as before.
+    """
     
-    def adaptive_text_processing(self, text, disability_type):
+    KINDS = ("lesson", "practice_questions", "comprehension_questions")
+    
+    def __init__(self, path="lesson_library.db"):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
         
-        prompt = ""
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # The overnight job writes while the app keeps reading
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS library (
+                kind TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                needs TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                content TEXT NOT NULL,
+                model TEXT,
+                created REAL NOT NULL,
+                PRIMARY KEY (kind, topic, needs, difficulty)
+            ) WITHOUT ROWID
+        """)
+        self._db.commit()
+    
+    def key(self, kind, topic, disabilities, difficulty):
+        """Normalize a request into its library key"""
+        return (kind, " ".join(topic.lower().split()), disability_label(disabilities or []) or "general",
+                (difficulty or "").lower())
+    
+    def get(self, kind, topic, disabilities, difficulty, count=True):
+        """The stored content, or None when it has to be generated live.
         
-        if disability_type == "dyslexia":
-            prompt = f"""
-            Reformat this text for a student with dyslexia:
-            1. Use simple, clear sentences (max 10 words each)
-            2. Break into small paragraphs (2-3 sentences max)
-            3. Put **key words** in bold
-            4. Add bullet points where helpful
-            5. Use active voice only
+        count=False looks without touching the hit rate.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content FROM library WHERE kind = ? AND topic = ? AND needs = ? AND difficulty = ?",
+                self.key(kind, topic, disabilities, difficulty)
+            ).fetchone()
+            if not count:
+                return row[0] if row else None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+    
+    def put(self, kind, topic, disabilities, difficulty, content, model=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO library VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self.key(kind, topic, disabilities, difficulty) + (content, model, time.time())
+            )
+            self._db.commit()
+    
+    def keys(self):
+        """Every stored (kind, topic, needs, difficulty)"""
+        with self._lock:
+            return set(self._db.execute("SELECT kind, topic, needs, difficulty FROM library"))
+    
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM library").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+DEFAULT_STUDENT = "default"
+
+DEFAULT_PROFILE = {
+    "reading_speed": "slow",
+    "visual_preference": "normal",
+    "audio_preference": True,
+    "attention_span": 10,
+    "learning_style": "visual",
+    "disabilities": []
+}
+
+@contextmanager
+def connect_db(path):
+    """Open a short-lived SQLite connection that commits on success"""
+    db = sqlite3.connect(path, timeout=30)
+    try:
+        with db:
+            yield db
+    finally:
+        db.close()
+
+def table_columns(db, table):
+    return [row[1] for row in db.execute(f"PRAGMA table_info({table})")]
+
+class ProgressStore:
+    """SQLite store for every student's learning progress and goals.
+    
+    Rows are partitioned by student_id. WAL mode lets many sessions write while
+    dashboards read, and per-student rollups are updated on every insert, so
+    neither a student's dashboard nor the class overview scans raw history.
+    """
+    
+    def __init__(self, path="empowered.db", legacy_progress="progress_student.json",
+                 legacy_goals="learning_goals.json"):
+        self.path = path
+        self._summary_cache = {}
+        
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS progress (
+                    id INTEGER PRIMARY KEY,
+                    student_id TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    time_spent REAL NOT NULL,
+                    quiz_score REAL,
+                    activity_type TEXT NOT NULL,
+                    disabilities TEXT NOT NULL
+                );
+                
+                CREATE TABLE IF NOT EXISTS goals (
+                    id INTEGER PRIMARY KEY,
+                    student_id TEXT NOT NULL,
+                    goal TEXT NOT NULL,
+                    created TEXT NOT NULL,
+                    status TEXT NOT NULL
+                );
+                
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            self._migrate(db)
+            db.executescript("""
+                CREATE INDEX IF NOT EXISTS idx_progress_student_timestamp ON progress(student_id, timestamp);
+                CREATE INDEX IF NOT EXISTS idx_progress_student_day ON progress(student_id, day);
+                CREATE INDEX IF NOT EXISTS idx_progress_topic ON progress(topic);
+                CREATE INDEX IF NOT EXISTS idx_progress_activity ON progress(activity_type);
+                CREATE INDEX IF NOT EXISTS idx_goals_student ON goals(student_id);
+                
+                -- Rollups kept up to date on every insert so dashboards never scan history
+                CREATE TABLE IF NOT EXISTS daily_totals (
+                    student_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    minutes REAL NOT NULL,
+                    activities INTEGER NOT NULL,
+                    PRIMARY KEY (student_id, day)
+                );
+                
+                CREATE TABLE IF NOT EXISTS topic_totals (
+                    student_id TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    minutes REAL NOT NULL,
+                    activities INTEGER NOT NULL,
+                    PRIMARY KEY (student_id, topic)
+                );
+                CREATE INDEX IF NOT EXISTS idx_topic_totals_minutes ON topic_totals(student_id, minutes);
+                
+                CREATE TABLE IF NOT EXISTS totals (
+                    student_id TEXT PRIMARY KEY,
+                    activities INTEGER NOT NULL DEFAULT 0,
+                    minutes REAL NOT NULL DEFAULT 0,
+                    score_sum REAL NOT NULL DEFAULT 0,
+                    score_count INTEGER NOT NULL DEFAULT 0,
+                    recent_scores TEXT NOT NULL DEFAULT '[]',
+                    last_day TEXT,
+                    streak INTEGER NOT NULL DEFAULT 0,
+                    version INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+        
+        if self.get_meta("rollups_built") is None:
+            self.rebuild_rollups()
+        if self.get_meta("legacy_imported") is None:
+            self.import_jsonl(legacy_progress, legacy_goals)
+    
+    def _migrate(self, db):
+        """Move single-student databases onto per-student partitions"""
+        for table in ("progress", "goals"):
+            if "student_id" not in table_columns(db, table):
+                db.execute(
+                    f"ALTER TABLE {table} ADD COLUMN student_id TEXT NOT NULL DEFAULT '{DEFAULT_STUDENT}'"
+                )
+        
+        totals_columns = table_columns(db, "totals")
+        if totals_columns and "student_id" not in totals_columns:
+            for table in ("daily_totals", "topic_totals", "totals"):
+                db.execute(f"DROP TABLE {table}")
+            db.execute("DELETE FROM meta WHERE key = 'rollups_built'")
+    
+    def _connect(self):
+        return connect_db(self.path)
+    
+    def get_meta(self, key):
+        with self._connect() as db:
+            row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def set_meta(self, key, value):
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+    
+    def add_progress(self, entry, student_id=DEFAULT_STUDENT):
+        """Record one activity entry as written by save_progress"""
+        with self._connect() as db:
+            self._insert_progress(db, entry, student_id)
+    
+    def _insert_progress(self, db, entry, student_id):
+        day = entry["timestamp"][:10]
+        topic = entry.get("topic", "Unknown")
+        minutes = entry.get("time_spent", 0)
+        score = entry.get("quiz_score")
+        
+        db.execute(
+            "INSERT INTO progress (student_id, timestamp, day, topic, time_spent, quiz_score, "
+            "activity_type, disabilities) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                student_id,
+                entry["timestamp"],
+                day,
+                topic,
+                minutes,
+                score,
+                entry.get("activity_type", "lesson"),
+                json.dumps(entry.get("disabilities", []))
+            )
+        )
+        self._roll_up(db, student_id, day, topic, minutes, score)
+    
+    def _roll_up(self, db, student_id, day, topic, minutes, score):
+        """Fold one new entry into the student's daily, topic and overall rollups"""
+        for table, key, value in (("daily_totals", "day", day), ("topic_totals", "topic", topic)):
+            db.execute(
+                f"INSERT INTO {table} (student_id, {key}, minutes, activities) VALUES (?, ?, ?, 1) "
+                f"ON CONFLICT(student_id, {key}) DO UPDATE SET minutes = minutes + excluded.minutes, "
+                f"activities = activities + 1",
+                (student_id, value, minutes)
+            )
+        
+        db.execute("INSERT OR IGNORE INTO totals (student_id) VALUES (?)", (student_id,))
+        score_sum, score_count, recent_scores, last_day, streak = db.execute(
+            "SELECT score_sum, score_count, recent_scores, last_day, streak FROM totals WHERE student_id = ?",
+            (student_id,)
+        ).fetchone()
+        
+        if score is not None:
+            score_sum += score
+            score_count += 1
+            recent_scores = json.dumps((json.loads(recent_scores) + [score])[-3:])
+        
+        if last_day is None or day > last_day:
+            previous = datetime.fromisoformat(last_day).date() if last_day else None
+            consecutive = previous is not None and (datetime.fromisoformat(day).date() - previous).days == 1
+            streak = streak + 1 if consecutive else 1
+            last_day = day
+        elif day < last_day:
+            # Back-dated entry (e.g. an import): the streak may have changed, so recount it
+            streak = self._count_streak(db, student_id)
+        
+        db.execute(
+            "UPDATE totals SET activities = activities + 1, minutes = minutes + ?, score_sum = ?, "
+            "score_count = ?, recent_scores = ?, last_day = ?, streak = ?, version = version + 1 "
+            "WHERE student_id = ?",
+            (minutes, score_sum, score_count, recent_scores, last_day, streak, student_id)
+        )
+    
+    def _count_streak(self, db, student_id):
+        days = [row[0] for row in db.execute(
+            "SELECT day FROM daily_totals WHERE student_id = ? ORDER BY day", (student_id,)
+        )]
+        return calculate_learning_streak(days)
+    
+    def rebuild_rollups(self):
+        """Recompute every student's rollups from the raw progress table"""
+        with self._connect() as db:
+            for table in ("daily_totals", "topic_totals", "totals"):
+                db.execute(f"DELETE FROM {table}")
+            
+            db.execute(
+                "INSERT INTO daily_totals SELECT student_id, day, SUM(time_spent), COUNT(*) "
+                "FROM progress GROUP BY student_id, day"
+            )
+            db.execute(
+                "INSERT INTO topic_totals SELECT student_id, topic, SUM(time_spent), COUNT(*) "
+                "FROM progress GROUP BY student_id, topic"
+            )
+            db.execute(
+                "INSERT INTO totals (student_id, activities, minutes, score_sum, score_count, last_day, version) "
+                "SELECT student_id, COUNT(*), SUM(time_spent), COALESCE(SUM(quiz_score), 0), COUNT(quiz_score), "
+                "MAX(day), 1 FROM progress GROUP BY student_id"
+            )
             
-            Text: {text}
+            for (student_id,) in db.execute("SELECT student_id FROM totals").fetchall():
+                recent_scores = [row[0] for row in db.execute(
+                    "SELECT quiz_score FROM progress WHERE student_id = ? AND quiz_score IS NOT NULL "
+                    "ORDER BY timestamp DESC LIMIT 3", (student_id,)
+                )][::-1]
+                db.execute(
+                    "UPDATE totals SET recent_scores = ?, streak = ? WHERE student_id = ?",
+                    (json.dumps(recent_scores), self._count_streak(db, student_id), student_id)
+                )
             
-            Output the reformatted text with clear structure.
-            """
-        
-        elif disability_type == "adhd":
-            prompt = f"""
-            Reformat this content for a student with ADHD:
-            1. Break into bite-sized chunks (50 words max per section)
-            2. Add 🎯 emoji markers for important points
-            3. Include "Brain Break!" reminders every 3 sections
-            4. Use exciting, engaging language
-            5. Add interactive prompts like "Think about this!"
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('rollups_built', ?)", (datetime.now().isoformat(),))
+        
+        self._summary_cache.clear()
+    
+    def version(self, student_id=None):
+        """Changes whenever progress is recorded for the student (or anyone, if None)"""
+        with self._connect() as db:
+            if student_id is None:
+                row = db.execute("SELECT COALESCE(SUM(version), 0) FROM totals").fetchone()
+            else:
+                row = db.execute("SELECT version FROM totals WHERE student_id = ?", (student_id,)).fetchone()
+        return row[0] if row else 0
+    
+    def add_goal(self, goal_data, student_id=DEFAULT_STUDENT):
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO goals (student_id, goal, created, status) VALUES (?, ?, ?, ?)",
+                (student_id, goal_data["goal"], goal_data["created"], goal_data.get("status", "active"))
+            )
+    
+    def history(self, student_id=DEFAULT_STUDENT):
+        """A student's progress entries, oldest first, in the save_progress format"""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT timestamp, topic, time_spent, quiz_score, activity_type, disabilities "
+                "FROM progress WHERE student_id = ? ORDER BY timestamp", (student_id,)
+            ).fetchall()
+        
+        return [
+            {
+                "timestamp": timestamp,
+                "topic": topic,
+                "time_spent": time_spent,
+                "quiz_score": quiz_score,
+                "activity_type": activity_type,
+                "disabilities": json.loads(disabilities)
+            }
+            for timestamp, topic, time_spent, quiz_score, activity_type, disabilities in rows
+        ]
+    
+    def summary(self, student_id=DEFAULT_STUDENT, chart_days=60):
+        """A student's dashboard figures read from the rollups, or None before any activity.
+        
+        The result is cached until the student's version changes, so reruns of
+        the dashboard cost one small query regardless of how much history there is.
+        """
+        version = self.version(student_id)
+        cached = self._summary_cache.get(student_id)
+        if cached and cached[0] == version:
+            return cached[1]
+        
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT activities, minutes, score_sum, score_count, recent_scores, streak "
+                "FROM totals WHERE student_id = ?", (student_id,)
+            ).fetchone()
+            
+            if not row or not row[0]:
+                return None
+            activities, minutes, score_sum, score_count, recent_scores, streak = row
+            
+            daily = db.execute(
+                "SELECT day, minutes, activities FROM daily_totals WHERE student_id = ? "
+                "ORDER BY day DESC LIMIT ?", (student_id, chart_days)
+            ).fetchall()[::-1]
+            top_topics = db.execute(
+                "SELECT topic, minutes FROM topic_totals WHERE student_id = ? "
+                "ORDER BY minutes DESC LIMIT 5", (student_id,)
+            ).fetchall()
+            unique_days = db.execute(
+                "SELECT COUNT(*) FROM daily_totals WHERE student_id = ?", (student_id,)
+            ).fetchone()[0]
+            unique_topics = db.execute(
+                "SELECT COUNT(*) FROM topic_totals WHERE student_id = ?", (student_id,)
+            ).fetchone()[0]
+        
+        recent_scores = json.loads(recent_scores)
+        summary = {
+            "activities": activities,
+            "total_time": minutes,
+            "avg_session_time": minutes / activities,
+            "avg_score": score_sum / score_count if score_count else None,
+            "recent_avg_score": sum(recent_scores) / len(recent_scores) if recent_scores else None,
+            "unique_topics": unique_topics,
+            "unique_days": unique_days,
+            "daily": daily,
+            "top_topics": top_topics,
+            "streak": streak
+        }
+        
+        self._summary_cache[student_id] = (version, summary)
+        return summary
+    
+    def class_overview(self):
+        """One row of totals per student, read from the rollups only"""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT student_id, activities, minutes, score_sum, score_count, last_day, streak "
+                "FROM totals ORDER BY student_id"
+            ).fetchall()
+        
+        return [
+            {
+                "student_id": student_id,
+                "activities": activities,
+                "minutes": minutes,
+                "avg_score": score_sum / score_count if score_count else None,
+                "last_day": last_day,
+                "streak": streak
+            }
+            for student_id, activities, minutes, score_sum, score_count, last_day, streak in rows
+        ]
+    
+    def class_topics(self, limit=10):
+        """Topics with the most learning time across the whole class"""
+        with self._connect() as db:
+            return db.execute(
+                "SELECT topic, SUM(minutes) AS total, SUM(activities), COUNT(*) FROM topic_totals "
+                "GROUP BY topic ORDER BY total DESC LIMIT ?", (limit,)
+            ).fetchall()
+    
+    def import_jsonl(self, progress_path="progress_student.json", goals_path="learning_goals.json",
+                     student_id=DEFAULT_STUDENT):
+        """One-shot import of the JSON-lines progress and goal logs for one student"""
+        imported = {"progress": 0, "goals": 0}
+        
+        with self._connect() as db:
+            for path, kind in ((progress_path, "progress"), (goals_path, "goals")):
+                try:
+                    with open(path, "r") as f:
+                        for line_number, line in enumerate(f, 1):
+                            if not line.strip():
+                                continue
+                            try:
+                                entry = json.loads(line)
+                                if kind == "progress":
+                                    self._insert_progress(db, entry, student_id)
+                                else:
+                                    db.execute(
+                                        "INSERT INTO goals (student_id, goal, created, status) VALUES (?, ?, ?, ?)",
+                                        (student_id, entry["goal"], entry["created"], entry.get("status", "active"))
+                                    )
+                                imported[kind] += 1
+                            except (ValueError, KeyError) as e:
+                                print(f"Skipping {path} line {line_number}: {e}")
+                except FileNotFoundError:
+                    pass
             
-            Content: {text}
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('legacy_imported', ?)", (datetime.now().isoformat(),))
+        
+        return imported
+
+class ProfileStore:
+    """Student identities and profiles, cached in memory and written through to SQLite"""
+    
+    def __init__(self, path="empowered.db", legacy_profile="student_profile.json"):
+        self.path = path
+        # Reentrant, so add_student can pick a free id and save it under one hold
+        self._lock = threading.RLock()
+        self._names = {}
+        self._profiles = {}
+        
+        with connect_db(path) as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS students (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    profile TEXT NOT NULL,
+                    updated TEXT NOT NULL
+                )
+            """)
+            for student_id, name, profile in db.execute("SELECT id, name, profile FROM students"):
+                self._names[student_id] = name
+                self._profiles[student_id] = json.loads(profile)
+        
+        if DEFAULT_STUDENT not in self._profiles:
+            try:
+                with open(legacy_profile, "r") as f:
+                    profile = json.load(f)
+            except FileNotFoundError:
+                profile = dict(DEFAULT_PROFILE)
+            self.save(DEFAULT_STUDENT, profile, name="Me")
+    
+    def students(self):
+        """(student_id, name) pairs sorted by name"""
+        with self._lock:
+            return sorted(self._names.items(), key=lambda item: item[1].lower())
+    
+    def name(self, student_id):
+        with self._lock:
+            return self._names.get(student_id, student_id)
+    
+    def get(self, student_id):
+        """A copy of the student's profile, or the defaults for an unknown student"""
+        with self._lock:
+            return json.loads(json.dumps(self._profiles.get(student_id, DEFAULT_PROFILE)))
+    
+    def save(self, student_id, profile, name=None):
+        """Persist the profile first, then update the in-memory copy"""
+        with self._lock:
+            name = name or self._names.get(student_id, student_id)
+            with connect_db(self.path) as db:
+                db.execute(
+                    "INSERT OR REPLACE INTO students VALUES (?, ?, ?, ?)",
+                    (student_id, name, json.dumps(profile), datetime.now().isoformat())
+                )
+            self._names[student_id] = name
+            self._profiles[student_id] = json.loads(json.dumps(profile))
+    
+    def add_student(self, name):
+        """Create a student with the default profile and return their id"""
+        base = re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-') or "student"
+        with self._lock:
+            student_id = base
+            suffix = 2
+            while student_id in self._names:
+                student_id = f"{base}-{suffix}"
+                suffix += 1
             
-            Make it super engaging and easy to focus on.
-            """
-        
-        elif disability_type == "autism":
-            prompt = f"""
-            Adapt this content for a student with autism:
-            1. Use clear, literal language (no metaphors or idioms)
-            2. Number each step or point clearly
-            3. Include predictable structure with headers
-            4. Be very specific and concrete
-            5. Add "What comes next:" transitions
+            self.save(student_id, dict(DEFAULT_PROFILE), name=name.strip())
+        return student_id
+
+class ClassAnalytics:
+    """Class-wide aggregates for the teacher dashboard, built with pandas.
+    
+    Progress rows are pulled into a columnar frame incrementally (only rows
+    newer than the last load), and every table the dashboard plots is reduced
+    from that frame with vectorized group-bys. The tables are cached until the
+    class's progress version changes.
+    """
+    
+    COLUMNS = ["id", "student_id", "day", "topic", "time_spent", "quiz_score", "activity_type", "disabilities"]
+    
+    def __init__(self, store, trend_days=30, chart_days=60):
+        self.store = store
+        self.trend_days = trend_days
+        self.chart_days = chart_days
+        self._lock = threading.Lock()
+        self._frame = None
+        self._last_id = 0
+        self._tables = None
+        self._version = None
+    
+    def _load_new_rows(self):
+        import pandas as pd
+        
+        with self.store._connect() as db:
+            new_rows = pd.read_sql_query(
+                f"SELECT {', '.join(self.COLUMNS)} FROM progress WHERE id > ? ORDER BY id",
+                db,
+                params=(self._last_id,)
+            )
+        
+        if new_rows.empty:
+            return
+        
+        # Parse each row's disability list once, when it is first loaded
+        new_rows["disabilities"] = new_rows["disabilities"].map(json.loads)
+        self._frame = new_rows if self._frame is None else pd.concat([self._frame, new_rows], ignore_index=True)
+        self._last_id = int(new_rows["id"].iloc[-1])
+    
+    def tables(self):
+        """Pre-aggregated tables keyed by chart, or None before any activity"""
+        with self._lock:
+            version = self.store.version()
+            if self._tables is not None and self._version == version:
+                return self._tables
             
-            Content: {text}
+            start = time.perf_counter()
+            self._load_new_rows()
+            if self._frame is None:
+                return None
             
-            Make it structured and predictable.
-            """
-        else:
-            prompt = f"""
-            Simplify this text for easier understanding:
-            1. Use simple words (grade 3-4 level)
-            2. Short sentences (10 words or less)
-            3. Explain any hard words
-            4. Add helpful examples
+            self._tables = self._aggregate(self._frame)
+            self._tables["build_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self._version = version
+            return self._tables
+    
+    def _aggregate(self, frame):
+        import pandas as pd
+        
+        students = frame.groupby("student_id").agg(
+            minutes=("time_spent", "sum"),
+            activities=("id", "size"),
+            avg_score=("quiz_score", "mean"),
+            active_days=("day", "nunique"),
+            last_day=("day", "max")
+        )
+        streaks = pd.DataFrame(self.store.class_overview()).set_index("student_id")["streak"]
+        students = students.join(streaks).reset_index()
+        
+        scores = frame["quiz_score"].dropna().clip(0, 100).to_numpy()
+        counts, edges = np.histogram(scores, bins=np.arange(0, 110, 10))
+        score_distribution = pd.DataFrame({
+            "range": [f"{int(low)}-{int(high)}" for low, high in zip(edges[:-1], edges[1:])],
+            "quizzes": counts
+        })
+        
+        days = np.sort(frame["day"].unique())
+        daily = frame[frame["day"].isin(days[-self.chart_days:])].groupby("day").agg(
+            minutes=("time_spent", "sum"),
+            students=("student_id", "nunique")
+        ).reset_index()
+        
+        recent = frame[frame["day"].isin(days[-self.trend_days:])]
+        top_topics = recent.groupby("topic")["time_spent"].sum().nlargest(5).index
+        topic_trend = recent[recent["topic"].isin(top_topics)].pivot_table(
+            index="day", columns="topic", values="time_spent", aggfunc="sum", fill_value=0
+        )
+        
+        groups = frame[["student_id", "time_spent", "quiz_score", "disabilities"]].copy()
+        groups["disabilities"] = groups["disabilities"].map(lambda needs: needs or ["None listed"])
+        disability_groups = groups.explode("disabilities").groupby("disabilities").agg(
+            students=("student_id", "nunique"),
+            activities=("time_spent", "size"),
+            avg_minutes=("time_spent", "mean"),
+            avg_score=("quiz_score", "mean")
+        ).reset_index().rename(columns={"disabilities": "group"})
+        
+        return {
+            "students": students,
+            "score_distribution": score_distribution,
+            "daily": daily,
+            "topic_trend": topic_trend,
+            "disability_groups": disability_groups,
+            "rows": len(frame)
+        }
+
+_progress_store = None
+_profile_store = None
+_class_analytics = None
+
+def get_progress_store():
+    """Process-wide progress store, opened on first use"""
+    global _progress_store
+    if _progress_store is None:
+        _progress_store = ProgressStore()
+    return _progress_store
+
+def get_class_analytics():
+    """Process-wide class analytics over the progress store"""
+    global _class_analytics
+    if _class_analytics is None:
+        _class_analytics = ClassAnalytics(get_progress_store())
+    return _class_analytics
+
+def get_profile_store():
+    """Process-wide profile store, opened on first use"""
+    global _profile_store
+    if _profile_store is None:
+        _profile_store = ProfileStore()
+    return _profile_store
+
+# Approximate resident size of each model, from the deployment README
+MODEL_FOOTPRINTS_GB = {
+    "gemma3n:e2b": 9.0,
+    "gemma3n:e4b": 10.0,
+    "empowered-gemma-3n-2b-q8:latest": 4.7
+}
+
+def system_memory_gb():
+    """Physical RAM of this machine, or None where it can't be read"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1e9
+    except (ValueError, OSError, AttributeError):
+        return None
+
+class ModelResidency:
+    """Tracks which models Ollama holds in memory and plans around the RAM budget.
+    
+    Footprints start from the deployment README and are replaced by the sizes
+    Ollama reports once a model is loaded. The most used models are pinned
+    (keep_alive -1) while they fit in the budget; the rest get a short
+    keep_alive so they free their memory soon after use. Loads and evictions
+    are found by diffing /api/ps between refreshes.
+    
+    The budget defaults to this machine's RAM minus headroom_gb; set
+    EMPOWERED_MODEL_MEMORY_GB when Ollama runs on another box.
+    """
+    
+    def __init__(self, client, memory_gb=None, headroom_gb=2.0, refresh_seconds=5,
+                 idle_keep_alive="2m", recent_window=50, max_events=100):
+        self.client = client
+        if memory_gb is None:
+            memory_gb = float(os.environ.get("EMPOWERED_MODEL_MEMORY_GB", 0)) or system_memory_gb() or 16.0
+        self.budget_gb = memory_gb - headroom_gb
+        self.footprints = dict(MODEL_FOOTPRINTS_GB)
+        self.refresh_seconds = refresh_seconds
+        self.idle_keep_alive = idle_keep_alive
+        self.recent_window = recent_window
+        self.max_events = max_events
+        self.events = []
+        self.hits = 0
+        self.misses = 0
+        self.reroutes = 0
+        self._recent = []
+        self._resident = set()
+        self._checked = 0.0
+        self._lock = threading.Lock()
+    
+    def _event(self, kind, model):
+        self.events.append({"time": datetime.now().isoformat(timespec="seconds"), "event": kind, "model": model})
+        del self.events[:-self.max_events]
+    
+    def refresh(self, force=False):
+        """Models Ollama currently holds in memory, re-checked at most every refresh_seconds"""
+        with self._lock:
+            if not force and time.time() - self._checked < self.refresh_seconds:
+                return set(self._resident)
+            first_check = not self._checked
+            self._checked = time.time()
+        
+        try:
+            loaded = self.client.ps()["models"]
+        except Exception:
+            with self._lock:
+                return set(self._resident)
+        
+        with self._lock:
+            resident = set()
+            for model in loaded:
+                resident.add(model["model"])
+                if model["size"]:
+                    self.footprints[model["model"]] = model["size"] / 1e9
             
-            Text: {text}
+            for model in sorted(resident - self._resident):
+                self._event("resident" if first_check else "load", model)
+            if not first_check:
+                for model in sorted(self._resident - resident):
+                    self._event("evict", model)
+            self._resident = resident
+            return set(resident)
+    
+    def observe(self, model):
+        """Count a request as a hit (model already loaded) or a miss (Ollama must load it)"""
+        resident = self.refresh()
+        with self._lock:
+            self._recent.append(model)
+            del self._recent[:-self.recent_window]
+            if model in resident:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._resident.add(model)
+                self._event("load", model)
+    
+    def route(self, model, substitutes=(), fits=None):
+        """Serve with model, or with an acceptable substitute that is already loaded.
+        
+        fits(substitute) says whether the request and its output budget fit in
+        the substitute's context; substitutes it rejects are never used.
+        """
+        resident = self.refresh()
+        if model in resident:
+            return model
+        for substitute in substitutes:
+            if substitute in resident and (fits is None or fits(substitute)):
+                with self._lock:
+                    self.reroutes += 1
+                return substitute
+        return model
+    
+    def plan(self, models):
+        """The models, in the order given, that fit in the budget together"""
+        planned = []
+        used = 0.0
+        for model in models:
+            footprint = self.footprints.get(model)
+            if footprint is not None and used + footprint <= self.budget_gb:
+                planned.append(model)
+                used += footprint
+        return planned
+    
+    def pinned(self):
+        """Models worth keeping loaded: the most used first, while they fit"""
+        with self._lock:
+            recent = list(self._recent)
+        return self.plan(sorted(self.footprints, key=lambda model: -recent.count(model)))
+    
+    def keep_alive_for(self, model):
+        """keep_alive for a request to model, or None for Ollama's default"""
+        if model not in self.footprints:
+            return None
+        return -1 if model in self.pinned() else self.idle_keep_alive
+    
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            resident = sorted(self._resident)
+            return {
+                "resident": resident,
+                "resident_gb": round(sum(self.footprints.get(model, 0) for model in resident), 1),
+                "budget_gb": round(self.budget_gb, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "reroutes": self.reroutes,
+                "events": list(self.events[-10:])
+            }
+
+class TokenBudgets:
+    """Output budgets per task, a fixed context size per model, and input token estimates.
+    
+    Ollama reloads a model whenever num_ctx changes, so the context size is set
+    once per model and tasks only vary num_predict. Input length is estimated
+    from a characters-per-token ratio that starts at 4 and is calibrated per
+    model from the prompt_eval_count Ollama reports. Every call's tokens in,
+    tokens out and generation speed are kept in a short log.
+    """
+    
+    def __init__(self, num_predict, num_ctx, default_ctx=4096, chars_per_token=4.0, margin=64,
+                 max_log=200):
+        self.num_predict = num_predict
+        self.num_ctx = num_ctx
+        self.default_ctx = default_ctx
+        self.default_chars_per_token = chars_per_token
+        self.margin = margin
+        self.max_log = max_log
+        self.chars_per_token = {}
+        self.log = []
+        self._lock = threading.Lock()
+    
+    def options(self, task, model, options=None):
+        """options with the task's num_predict filled in and num_ctx set to the model's"""
+        options = dict(options or {})
+        # Always the serving model's own size: one sized for another model would force a reload
+        options["num_ctx"] = self.num_ctx.get(model, self.default_ctx)
+        if task in self.num_predict:
+            options.setdefault("num_predict", self.num_predict[task])
+        return options
+    
+    def estimate(self, model, text):
+        """Approximate token count of text for model"""
+        return int(len(text) / self.chars_per_token.get(model, self.default_chars_per_token)) + 1
+    
+    def max_input_chars(self, task, model, system=""):
+        """Characters of user content that fit beside the system prompt and the output budget"""
+        tokens = (self.num_ctx.get(model, self.default_ctx) - self.num_predict.get(task, 0)
+                  - self.estimate(model, system) - self.margin)
+        return max(int(tokens * self.chars_per_token.get(model, self.default_chars_per_token)), 500)
+    
+    def fits(self, task, model, chars, options=None):
+        """Whether chars of prompt plus the task's output budget fit in model's context"""
+        num_predict = (options or {}).get("num_predict", self.num_predict.get(task, 0))
+        tokens = int(chars / self.chars_per_token.get(model, self.default_chars_per_token)) + 1
+        return tokens + num_predict + self.margin <= self.num_ctx.get(model, self.default_ctx)
+    
+    def record(self, task, model, prompt_chars, response):
+        """Calibrate from a finished call and log its tokens in/out and tokens/sec"""
+        tokens_in = response['prompt_eval_count'] or 0
+        tokens_out = response['eval_count'] or 0
+        eval_seconds = (response['eval_duration'] or 0) / 1e9
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "task": task,
+            "model": model,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_per_second": round(tokens_out / eval_seconds, 1) if eval_seconds else None
+        }
+        
+        with self._lock:
+            # A count far below the text length means the prefix came from the KV cache
+            if tokens_in and prompt_chars / tokens_in < 8:
+                ratio = self.chars_per_token.get(model, self.default_chars_per_token)
+                self.chars_per_token[model] = min(max(0.8 * ratio + 0.2 * prompt_chars / tokens_in, 2.0), 6.0)
+            self.log.append(entry)
+            del self.log[:-self.max_log]
+        
+        logger.debug("%s on %s: %d tokens in, %d out, %s tok/s",
+                     task, model, tokens_in, tokens_out, entry["tokens_per_second"] or 0)
+        return entry
+
+def disability_label(disabilities):
+    """One metrics label for a set of disabilities, the same whatever their order"""
+    return "+".join(sorted({disability.lower() for disability in disabilities})) or None
+
+def escape_label(value):
+    """Escape a Prometheus label value"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class CallMetrics:
+    """Where each model call's time went, tagged by task, model and disability profile.
+    
+    Ollama's final response reports the total time and how much of it went to
+    loading the model, evaluating the prompt and decoding the answer. Calls
+    are summed per label set for a Prometheus-style /metrics page, kept in a
+    short recent list for the sidebar, and, when log_path is set, appended as
+    JSON lines to a rotating log. A load taking longer than stall_seconds
+    counts as a load stall.
+    """
+    
+    PHASES = (
+        ("total", "total_duration"),
+        ("load", "load_duration"),
+        ("prompt_eval", "prompt_eval_duration"),
+        ("eval", "eval_duration")
+    )
+    
+    def __init__(self, log_path=None, max_bytes=10 * 1024 * 1024, backups=5, max_recent=200,
+                 stall_seconds=1.0):
+        self.max_recent = max_recent
+        self.stall_seconds = stall_seconds
+        self.recent = []
+        self.totals = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._log = None
+        if log_path:
+            self._log = logging.getLogger(f"empowered.metrics.{os.path.abspath(log_path)}")
+            self._log.setLevel(logging.INFO)
+            self._log.propagate = False
+            if not self._log.handlers:
+                self._log.addHandler(RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups))
+    
+    def record(self, task, model, disability, response):
+        """Account one finished call from its final response or stream chunk"""
+        seconds = {phase: (response[field] or 0) / 1e9 for phase, field in self.PHASES}
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "task": task or "other",
+            "model": model,
+            "disability": disability or "none",
+            **{f"{phase}_seconds": round(value, 4) for phase, value in seconds.items()},
+            "prompt_tokens": response['prompt_eval_count'] or 0,
+            "output_tokens": response['eval_count'] or 0,
+            "load_stall": seconds["load"] >= self.stall_seconds
+        }
+        
+        labels = (entry["task"], entry["model"], entry["disability"])
+        with self._lock:
+            totals = self.totals.setdefault(labels, {
+                "calls": 0, "load_stalls": 0, "prompt_tokens": 0, "output_tokens": 0,
+                **{f"{phase}_seconds": 0.0 for phase, _ in self.PHASES}
+            })
+            totals["calls"] += 1
+            totals["load_stalls"] += entry["load_stall"]
+            totals["prompt_tokens"] += entry["prompt_tokens"]
+            totals["output_tokens"] += entry["output_tokens"]
+            for phase, value in seconds.items():
+                totals[f"{phase}_seconds"] += value
+            self.recent.append(entry)
+            del self.recent[:-self.max_recent]
+        
+        if self._log:
+            self._log.info(json.dumps(entry))
+        return entry
+    
+    def summary(self):
+        """Per (task, model) call counts and average milliseconds per phase, slowest first"""
+        grouped = {}
+        with self._lock:
+            for (task, model, _), totals in self.totals.items():
+                row = grouped.setdefault((task, model), {"task": task, "model": model, "calls": 0,
+                                                         "load_stalls": 0, "seconds": {}})
+                row["calls"] += totals["calls"]
+                row["load_stalls"] += totals["load_stalls"]
+                for phase, _ in self.PHASES:
+                    row["seconds"][phase] = row["seconds"].get(phase, 0.0) + totals[f"{phase}_seconds"]
+        
+        rows = []
+        for row in grouped.values():
+            rows.append({
+                "task": row["task"],
+                "model": row["model"],
+                "calls": row["calls"],
+                "load_stalls": row["load_stalls"],
+                **{f"{phase}_ms": round(row["seconds"][phase] / row["calls"] * 1000)
+                   for phase, _ in self.PHASES}
+            })
+        return sorted(rows, key=lambda row: -row["total_ms"])
+    
+    def prometheus(self):
+        """All totals in the Prometheus text exposition format"""
+        lines = [
+            "# HELP empowered_model_calls_total Finished Ollama calls.",
+            "# TYPE empowered_model_calls_total counter",
+            "# HELP empowered_model_load_stalls_total Calls that waited for the model to load.",
+            "# TYPE empowered_model_load_stalls_total counter",
+            "# HELP empowered_model_seconds_total Seconds spent per phase: total, load, prompt_eval, eval.",
+            "# TYPE empowered_model_seconds_total counter",
+            "# HELP empowered_model_tokens_total Tokens evaluated (prompt) and generated (output).",
+            "# TYPE empowered_model_tokens_total counter"
+        ]
+        with self._lock:
+            for (task, model, disability), totals in sorted(self.totals.items()):
+                labels = ",".join(
+                    f'{name}="{escape_label(value)}"'
+                    for name, value in (("task", task), ("model", model), ("disability", disability))
+                )
+                lines.append(f"empowered_model_calls_total{{{labels}}} {totals['calls']}")
+                lines.append(f"empowered_model_load_stalls_total{{{labels}}} {totals['load_stalls']}")
+                for phase, _ in self.PHASES:
+                    lines.append(f'empowered_model_seconds_total{{{labels},phase="{phase}"}} '
+                                 f'{totals[f"{phase}_seconds"]:.6f}')
+                for kind in ("prompt", "output"):
+                    lines.append(f'empowered_model_tokens_total{{{labels},kind="{kind}"}} '
+                                 f'{totals[f"{kind}_tokens"]}')
+        return "\n".join(lines) + "\n"
+    
+    def serve(self, port, host="127.0.0.1"):
+        """Serve prometheus() at http://host:port/metrics from a background thread"""
+        if self._server:
+            return self._server
+        metrics = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
             
-            Make it very easy to understand.
-            """
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="empowered-metrics", daemon=True).start()
+        print(f"📈 Model metrics at http://{host}:{port}/metrics")
+        return self._server
+
+class ModelRouter:
+    """Chooses a model for each task from observed latency and load.
+    
+    Each task lists its candidate models best first, ending with the smallest
+    quantization. The router keeps a rolling window of latencies per task and
+    model, and picks the first candidate whose p95 fits the latency budget and
+    whose slots aren't saturated. Candidates with no samples yet are assumed to
+    fit; if none fits, the one with the lowest p95 is used.
+    
+    A model over budget would otherwise never be measured again, so samples
+    expire after max_age seconds and every probe_every-th pass over such a
+    model sends the request to it anyway. Calls that waited longer than
+    stall_seconds for a model load say nothing about its speed and are not
+    recorded.
+    """
+    
+    def __init__(self, client, window=50, percentile=95, max_age=600, probe_every=20, stall_seconds=1.0):
+        self.client = client
+        self.window = window
+        self.percentile = percentile
+        self.max_age = max_age
+        self.probe_every = probe_every
+        self.stall_seconds = stall_seconds
+        self.samples = {}
+        self.choices = {}
+        self._passed = {}
+        self._lock = threading.Lock()
+    
+    def record(self, task, model, seconds, load_seconds=0.0):
+        """Add one observed end-to-end latency, unless the call waited for the model to load"""
+        if load_seconds >= self.stall_seconds:
+            return
+        with self._lock:
+            samples = self.samples.setdefault((task, model), [])
+            samples.append((time.time(), seconds))
+            del samples[:-self.window]
+    
+    def _recent(self, task, model):
+        """Latencies recorded within the last max_age seconds"""
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            return [seconds for recorded, seconds in self.samples.get((task, model), []) if recorded >= cutoff]
+    
+    def _probe(self, task, model):
+        """True on every probe_every-th pass over an over-budget model, to re-measure it"""
+        with self._lock:
+            passed = self._passed.get((task, model), 0) + 1
+            self._passed[(task, model)] = passed % self.probe_every
+        return passed >= self.probe_every
+    
+    def latency(self, task, model, percentile=None):
+        """Rolling latency percentile in seconds, or None before any recent samples"""
+        samples = self._recent(task, model)
+        if not samples:
+            return None
+        return float(np.percentile(samples, percentile or self.percentile))
+    
+    def saturated(self, model):
+        """True while requests are queuing for one of the model's slots"""
+        return self.client.queue_depth().get(model, 0) > 0
+    
+    def select(self, task, candidates, budget):
+        """First candidate expected to answer within budget seconds"""
+        chosen = None
+        fastest, fastest_latency = None, None
+        
+        for model in candidates:
+            if model != candidates[-1] and self.saturated(model):
+                continue
+            latency = self.latency(task, model)
+            if latency is None or latency <= budget or self._probe(task, model):
+                chosen = model
+                break
+            if fastest_latency is None or latency < fastest_latency:
+                fastest, fastest_latency = model, latency
         
-        response = ollama.generate(
-            model=self.fast_model,
-            prompt=prompt,
+        chosen = chosen or fastest or candidates[-1]
+        with self._lock:
+            self.choices[(task, chosen)] = self.choices.get((task, chosen), 0) + 1
+        return chosen
+    
+    def stats(self):
+        """p50/p95 latency, sample count and times chosen per (task, model)"""
+        with self._lock:
+            keys = sorted(set(self.samples) | set(self.choices))
+            choices = dict(self.choices)
+        
+        return [
+            {
+                "task": task,
+                "model": model,
+                "p50": self.latency(task, model, 50),
+                "p95": self.latency(task, model, 95),
+                "samples": len(self._recent(task, model)),
+                "chosen": choices.get((task, model), 0)
+            }
+            for task, model in keys
+        ]
+
+class ModelClient:
+    """Shared connection pool to Ollama with per-model concurrency limits and timeouts.
+    
+    Synchronous calls go through one ollama.Client. Concurrent batches run on an
+    ollama.AsyncClient inside a single background event loop, so its keep-alive
+    connections survive between batches. Both paths share the same per-model
+    slots, so extra requests queue here instead of piling up on the daemon,
+    and both report to the residency tracker, which also picks keep_alive.
+    """
+    
+    def __init__(self, host=None, timeout=180, max_in_flight=2, queue_timeout=300):
+        self.host = host
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.queue_timeout = queue_timeout
+        self.client = ollama.Client(host=host, timeout=timeout)
+        self._slots = {}
+        self._waiting = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._async_client = None
+        # keep_alive sent with every request for pinned models, so use doesn't reset residency
+        self.keep_alive = {}
+        self.residency = ModelResidency(self.client)
+    
+    def _slot(self, model):
+        with self._lock:
+            if model not in self._slots:
+                self._slots[model] = threading.Semaphore(self.max_in_flight)
+            return self._slots[model]
+    
+    def allow_in_flight(self, count):
+        """Raise the per-model limit to count concurrent requests, e.g. one per batch worker.
+        
+        Existing slots are widened in place, so requests holding one still count against the limit.
+        """
+        with self._lock:
+            if count > self.max_in_flight:
+                for slot in self._slots.values():
+                    slot.release(count - self.max_in_flight)
+                self.max_in_flight = count
+    
+    def _count_waiting(self, model, delta):
+        with self._lock:
+            self._waiting[model] = self._waiting.get(model, 0) + delta
+    
+    @contextmanager
+    def reserve(self, model):
+        """Hold one of the model's in-flight slots, queuing while all are busy"""
+        slot = self._slot(model)
+        self._count_waiting(model, 1)
+        try:
+            acquired = slot.acquire(timeout=self.queue_timeout)
+        finally:
+            self._count_waiting(model, -1)
+        
+        if not acquired:
+            raise TimeoutError(f"No free slot on {model} after {self.queue_timeout}s")
+        try:
+            yield
+        finally:
+            slot.release()
+    
+    def _with_keep_alive(self, request):
+        keep_alive = self.keep_alive.get(request["model"])
+        if keep_alive is None:
+            keep_alive = self.residency.keep_alive_for(request["model"])
+        if keep_alive is not None and "keep_alive" not in request:
+            request = dict(request, keep_alive=keep_alive)
+        return request
+    
+    def call(self, kind, stream=False, **request):
+        """Run a generate/chat request on the shared synchronous client"""
+        request = self._with_keep_alive(request)
+        self.residency.observe(request["model"])
+        method = self.client.chat if kind == "chat" else self.client.generate
+        if stream:
+            return self._stream(method, request)
+        
+        with self.reserve(request["model"]):
+            return method(**request)
+    
+    def _stream(self, method, request):
+        # The slot is held until the stream is exhausted or closed
+        with self.reserve(request["model"]):
+            yield from method(stream=True, **request)
+    
+    async def _acall(self, kind, request):
+        slot = self._slot(request["model"])
+        self._count_waiting(request["model"], 1)
+        try:
+            # Wait on a worker thread so the event loop keeps serving the other calls
+            acquired = await asyncio.get_running_loop().run_in_executor(
+                None, slot.acquire, True, self.queue_timeout
+            )
+        finally:
+            self._count_waiting(request["model"], -1)
+        
+        if not acquired:
+            raise TimeoutError(f"No free slot on {request['model']} after {self.queue_timeout}s")
+        try:
+            method = self._async_client.chat if kind == "chat" else self._async_client.generate
+            return await asyncio.wait_for(method(**self._with_keep_alive(request)), self.timeout)
+        finally:
+            slot.release()
+    
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="empowered-ollama", daemon=True).start()
+                self._async_client = ollama.AsyncClient(host=self.host, timeout=self.timeout)
+            return self._loop
+    
+    def gather(self, calls):
+        """Run (kind, request) pairs concurrently; failed calls yield their exception"""
+        for _, request in calls:
+            self.residency.observe(request["model"])
+        
+        async def run_all():
+            return await asyncio.gather(
+                *(self._acall(kind, request) for kind, request in calls),
+                return_exceptions=True
+            )
+        
+        return asyncio.run_coroutine_threadsafe(run_all(), self._ensure_loop()).result()
+    
+    def embed(self, model, text):
+        """The embedding vector of text from an Ollama embedding model"""
+        request = self._with_keep_alive({"model": model, "input": text})
+        with self.reserve(model):
+            return self.client.embed(**request)['embeddings'][0]
+    
+    def warm(self, model, keep_alive=-1, options=None):
+        """Load a model with an empty prompt and pin it for keep_alive; returns seconds taken.
+        
+        options must carry the num_ctx later requests use, or the first of them reloads the model.
+        """
+        self.keep_alive[model] = keep_alive
+        start = time.time()
+        self.client.generate(model=model, prompt="", keep_alive=keep_alive, options=options)
+        seconds = time.time() - start
+        self.residency.refresh(force=True)
+        return seconds
+    
+    def loaded_models(self):
+        """Names of the models Ollama currently holds in memory"""
+        return self.residency.refresh()
+    
+    def queue_depth(self):
+        """Requests currently waiting for a slot, per model"""
+        with self._lock:
+            return {model: count for model, count in self._waiting.items() if count}
+
+class Prefetch:
+    """A speculative background generation that can be dropped if it is no longer wanted"""
+    
+    def __init__(self, executor, key, fn, *args, **kwargs):
+        self.key = key
+        self.cancelled = threading.Event()
+        self.future = executor.submit(fn, *args, cancel_event=self.cancelled, **kwargs)
+    
+    def cancel(self):
+        """Stop the generation at its next token, or before it starts"""
+        self.cancelled.set()
+        self.future.cancel()
+    
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+class Flight:
+    """One in-flight generation and the tokens it has written so far.
+    
+    A subscriber counts as reading from the first token it asks for. Joins
+    that haven't started reading keep the flight wanted for start_grace
+    seconds only, so a stream that is never iterated doesn't keep the
+    model busy. Once nobody reads, the flight closes for good.
+    """
+    
+    def __init__(self, key, start_grace=10):
+        self.key = key
+        self.start_grace = start_grace
+        self.tokens = []
+        self.done = False
+        self.closed = False
+        self.error = None
+        self.subscribers = 0
+        self.joining = 0
+        self.joined = time.time()
+        self.condition = threading.Condition()
+    
+    def publish(self, token):
+        with self.condition:
+            self.tokens.append(token)
+            self.condition.notify_all()
+    
+    def join(self):
+        """Reserve a place for one more reader; False once the flight has closed"""
+        with self.condition:
+            if self.closed:
+                return False
+            self.joining += 1
+            self.joined = time.time()
+            return True
+    
+    def wanted(self):
+        """Whether anyone is still reading the answer; closes the flight when not"""
+        with self.condition:
+            starting = self.joining and time.time() - self.joined < self.start_grace
+            if not self.subscribers and not starting:
+                self.closed = True
+            return not self.closed
+    
+    def stream(self):
+        """Yield every token of the answer from the first, following along until it is finished"""
+        with self.condition:
+            self.joining -= 1
+            self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                with self.condition:
+                    while position == len(self.tokens) and not self.done:
+                        self.condition.wait()
+                    tokens = self.tokens[position:]
+                    position = len(self.tokens)
+                    done = self.done
+                yield from tokens
+                if done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+    
+    def result(self):
+        return "".join(self.stream())
+
+class SingleFlight:
+    """Coalesces identical in-flight generations into one model call.
+    
+    The first request for a key starts the generation on its own thread,
+    which writes tokens into a shared Flight. Identical requests arriving
+    before it finishes subscribe to that Flight instead of queueing another
+    call: they replay the tokens written so far, then follow along. The
+    generation stops early once every subscriber has gone away; the Flight
+    is closed first, so a request arriving after that starts a new one
+    rather than reading a cut-off answer.
+    """
+    
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.shared = 0
+    
+    def join(self, key, produce):
+        """Subscribe to key's Flight, running produce(flight) on a new thread if none is in the air"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None or not flight.join()
+            if leader:
+                flight = self._flights[key] = Flight(key)
+                flight.join()
+                self.started += 1
+            else:
+                self.shared += 1
+        
+        if leader:
+            threading.Thread(target=self._run, args=(flight, produce), name="empowered-flight", daemon=True).start()
+        return flight
+    
+    def _run(self, flight, produce):
+        try:
+            produce(flight)
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+            with flight.condition:
+                if flight.closed and flight.error is None:
+                    # Only a reader that waited past start_grace can see this
+                    flight.error = RuntimeError("The answer was stopped because nobody was reading it")
+                flight.done = True
+                flight.condition.notify_all()
+    
+    def stats(self):
+        with self._lock:
+            total = self.started + self.shared
+            return {
+                "started": self.started,
+                "shared": self.shared,
+                "in_flight": len(self._flights),
+                "share_rate": self.shared / total if total else 0.0
+            }
+
+class EmpowerEdAssistant:
+    def __init__(self, cache_dir=""):
+        # cache_dir holds the response cache, semantic cache and lesson library (default: the working directory)
+        self.fast_model = "gemma3n:e2b"
+        self.accurate_model = "empowered-gemma-3n-2b-q8:latest"
+        self.vision_model = "gemma3n:e4b"
+        # Small embedding model for matching lesson topics asked in other words
+        self.embedding_model = os.environ.get("EMPOWERED_EMBED_MODEL", "nomic-embed-text")
+        # Candidate models per task, best first, ending with the smallest quantization
+        self.task_models = {
+            "text_adaptation": (self.fast_model, self.accurate_model),
+            "visual_guide": (self.fast_model, self.accurate_model),
+            "educational_content": (self.fast_model, self.accurate_model),
+            "comprehension_questions": (self.fast_model, self.accurate_model),
+            "practice_questions": (self.fast_model, self.accurate_model),
+            "lesson": (self.accurate_model,),
+            "image_description": (self.vision_model,),
+            "image_guide": (self.vision_model,),
+            "summary": (self.fast_model, self.accurate_model)
+        }
+        # Seconds a student should wait at most for a full answer
+        self.latency_budgets = {
+            "text_adaptation": 20,
+            "visual_guide": 30,
+            "educational_content": 30,
+            "comprehension_questions": 20,
+            "practice_questions": 15,
+            "lesson": 45,
+            "image_description": 30,
+            "image_guide": 45,
+            "summary": 30
+        }
+        # Output tokens per task, and one context size per model so Ollama never reloads for it
+        self.budgets = TokenBudgets(
+            num_predict={
+                "text_adaptation": 2048,
+                "visual_guide": 768,
+                "educational_content": 768,
+                "comprehension_questions": 384,
+                "practice_questions": 1024,
+                "lesson": 1536,
+                "image_description": 384,
+                "image_guide": 768,
+                "summary": 512
+            },
+            num_ctx={
+                # Whole worksheets in one pass; e2b's cache is small enough to afford it
+                self.fast_model: 8192,
+                # Short lesson prompts, and the fine-tune never saw long contexts
+                self.accurate_model: 4096,
+                # One image plus a short guide prompt; keeps the largest model's cache small
+                self.vision_model: 4096
+            }
+        )
+        # Audio devices are probed on first use, not on every session start
+        self._recognizer = None
+        self._microphone = None
+        self.client = ModelClient()
+        self.router = ModelRouter(self.client)
+        self.background = ThreadPoolExecutor(max_workers=4, thread_name_prefix="empowered-prefetch")
+        self.practice_metrics = {
+            "requests": 0,
+            "generations": 0,
+            "parse_failures": 0,
+            "invalid_items": 0,
+            "retries": 0,
+            "fallbacks": 0
+        }
+        self._metrics_lock = threading.Lock()
+        # Load, prompt-eval and decode time of every call, by task, model and disability
+        self.metrics = CallMetrics(log_path=os.environ.get("EMPOWERED_METRICS_LOG"))
+        self.response_cache = ResponseCache(os.path.join(cache_dir, "response_cache.db"))
+        # Identical requests already being answered share that answer instead of queueing again
+        self.flights = SingleFlight()
+        # Content generated overnight by build_library.py, served before anything else
+        self.library = LessonLibrary(os.path.join(cache_dir, "lesson_library.db"))
+        # Lessons on the same topic in other words reuse earlier lessons. Passages never do:
+        # two worksheets differing in one number embed alike but need different adaptations
+        self.semantic_cache = SemanticCache(
+            lambda text: self.client.embed(self.embedding_model, text),
+            path=os.path.join(cache_dir, "semantic_cache.db"),
+            thresholds={"lesson": 0.88}
+        )
+        # Recent vision results by perceptual hash, so re-uploaded photos skip the vision model
+        self.vision_memo = []
+        self.vision_memo_size = 64
+        self.vision_match_bits = 6
+        self._vision_memo_lock = threading.Lock()
+        self.warmup_status = {}
+    
+    @property
+    def recognizer(self):
+        if self._recognizer is None:
+            self._recognizer = sr.Recognizer()
+        return self._recognizer
+    
+    @property
+    def microphone(self):
+        if self._microphone is None:
+            self._microphone = sr.Microphone()
+        return self._microphone
+    
+    def models(self):
+        """The configured models, without duplicates"""
+        return list(dict.fromkeys([self.fast_model, self.accurate_model, self.vision_model]))
+    
+    def select_model(self, task_type, latency_budget=None):
+        """The best model for task_type expected to answer within latency_budget seconds"""
+        candidates = self.task_models.get(task_type, (self.fast_model,))
+        budget = latency_budget or self.latency_budgets.get(task_type, 30)
+        return self.router.select(task_type, candidates, budget)
+    
+    def routed_model(self, task_type, text="", system=""):
+        """The model that will actually serve text for task_type: select_model's pick after routing.
+        
+        Inputs must be sized for the returned model, not the one first selected,
+        since routing may hand the request to a substitute with a smaller
+        context. Only substitutes that can hold the text are considered.
+        """
+        model = self.select_model(task_type)
+        # Text too long for the selected model would go out in chunks of its input limit
+        chars = len(system) + min(len(text), self.budgets.max_input_chars(task_type, model, system))
+        return self.client.residency.route(
+            model, self.substitutes(model), lambda substitute: self.budgets.fits(task_type, substitute, chars)
+        )
+    
+    def substitutes(self, model):
+        """Already-loaded models that may answer for model without losing quality.
+        
+        The fine-tuned and e4b models can both take over plain text work from
+        the fast model; the fine-tuned and vision models have no stand-ins.
+        """
+        if model != self.fast_model:
+            return []
+        return [substitute for substitute in (self.accurate_model, self.vision_model) if substitute != model]
+    
+    def _route(self, request, task=None, options=None):
+        # Image requests must stay on the model that was asked for
+        if "images" in request or any("images" in message for message in request.get("messages", [])):
+            return request
+        chars = prompt_chars(request)
+        request["model"] = self.client.residency.route(
+            request["model"], self.substitutes(request["model"]),
+            lambda substitute: self.budgets.fits(task, substitute, chars, options)
+        )
+        return request
+    
+    def _fold_system(self, request):
+        """Move a template's instructions to the start of the user turn for the fine-tuned model.
+        
+        It was trained on user-turn instructions only, and a system field would
+        replace the EmpowerEd persona its Modelfile sets. The instructions
+        still come first, so the prefix stays the same across requests.
+        """
+        if request["model"] != self.accurate_model:
+            return request
+        if "system" in request:
+            request["prompt"] = f"{request.pop('system')}\n\n{request['prompt']}"
+        messages = request.get("messages")
+        if messages and len(messages) > 1 and messages[0]["role"] == "system":
+            request["messages"] = [
+                dict(messages[1], content=f"{messages[0]['content']}\n\n{messages[1]['content']}")
+            ] + messages[2:]
+        return request
+    
+    def warm_up(self, keep_alive=-1):
+        """Preload the configured models that fit in memory together"""
+        planned = self.client.residency.plan(self.models())
+        for model in self.models():
+            if model not in planned:
+                self.warmup_status[model] = "skipped: doesn't fit in memory with the others"
+                continue
+            self.warmup_status[model] = "warming"
+            try:
+                seconds = self.client.warm(
+                    model, keep_alive, {"num_ctx": self.budgets.num_ctx.get(model, self.budgets.default_ctx)}
+                )
+                self.warmup_status[model] = f"loaded in {seconds:.1f}s"
+            except Exception as e:
+                self.warmup_status[model] = f"failed: {e}"
+    
+    def generate(self, model, prompt, options=None, stream=False, format=None, task=None, system=None,
+                 disability=None, use_cache=True, check=None):
+        """Run a completion, returning the text or a token generator when streaming.
+        
+        format may be "json" or a JSON schema to constrain the output. The
+        latency of uncached calls is reported to the router under task.
+        system carries a template's fixed instructions, ahead of the prompt.
+        disability labels the call's metrics with the profile it was made for.
+        use_cache=False asks the model even if a saved answer exists. check is
+        called with every complete answer the model writes (never with saved
+        ones), and the answer is only saved if it returns True.
+        """
+        request = {"model": model, "prompt": prompt}
+        if system:
+            request["system"] = system
+        if format:
+            request["format"] = format
+        return self._request("generate", request, options, stream, task, disability, use_cache, check)
+    
+    def chat(self, model, messages, options=None, stream=False, format=None, task=None, system=None,
+             disability=None):
+        """Run a chat completion, returning the text or a token generator when streaming"""
+        if system:
+            messages = [{'role': 'system', 'content': system}] + messages
+        request = {"model": model, "messages": messages}
+        if format:
+            request["format"] = format
+        return self._request("chat", request, options, stream, task, disability)
+    
+    def _request(self, kind, request, options, stream, task=None, disability=None, use_cache=True, check=None):
+        """Serve a generate/chat request from the response cache or the model"""
+        self._fold_system(self._route(request, task, options))
+        options = self.budgets.options(task, request["model"], options)
+        request["options"] = options
+        
+        cache_key, cached = self._cache_lookup(request, options) if use_cache else (None, None)
+        if cached is not None:
+            return iter([cached]) if stream else cached
+        
+        flight = self.flights.join(
+            cache_key or self.response_cache.make_key(request["model"], request, options),
+            lambda flight: self._fly(flight, kind, request, cache_key, task, disability, check)
+        )
+        return flight.stream() if stream else flight.result()
+    
+    def _cache_lookup(self, request, options):
+        if not self.response_cache.should_cache(options):
+            return None, None
+        cache_key = self.response_cache.make_key(request["model"], request, options)
+        return cache_key, self.response_cache.get(cache_key)
+    
+    def note_usage(self, task, request, response, disability=None):
+        """Account a final response's token counts and timings to the task"""
+        if response['total_duration'] is None:
+            return
+        self.budgets.record(task, request["model"], prompt_chars(request), response)
+        self.metrics.record(task, request["model"], disability, response)
+    
+    def _semantic(self, scope, query, produce, stream):
+        """Serve produce()'s answer from the semantic cache, or run it and remember the answer"""
+        if not self.response_cache.cache_sampled:
+            return produce()
+        
+        cached, vector = self.semantic_cache.lookup(scope, query)
+        if cached is not None:
+            return iter([cached]) if stream else cached
+        
+        start = time.time()
+        if not stream:
+            text = produce()
+            self.semantic_cache.put(scope, query, vector, text, time.time() - start)
+            return text
+        return self._remember_semantic(produce(), scope, query, vector, start)
+    
+    def _remember_semantic(self, tokens, scope, query, vector, start):
+        text = ""
+        for token in tokens:
+            text += token
+            yield token
+        self.semantic_cache.put(scope, query, vector, text, time.time() - start)
+    
+    def count(self, metric, amount=1):
+        """Increment one of the practice-question counters"""
+        with self._metrics_lock:
+            self.practice_metrics[metric] += amount
+    
+    def prefetch(self, key, fn, *args, **kwargs):
+        """Start fn in the background; it must accept a cancel_event keyword"""
+        return Prefetch(self.background, key, fn, *args, **kwargs)
+    
+    def generate_many(self, calls):
+        """Run independent requests concurrently and return their texts in order.
+        
+        Each call is a dict with kind ("generate" or "chat"), model, prompt or
+        messages, and optional options, task and disability. A failed call
+        returns its exception.
+        """
+        results = [None] * len(calls)
+        misses = []
+        
+        for i, call in enumerate(calls):
+            request = self._route({key: value for key, value in call.items()
+                                   if key not in ("kind", "task", "disability") and value is not None},
+                                  call.get("task"), call.get("options"))
+            self._fold_system(request)
+            request["options"] = self.budgets.options(call.get("task"), request["model"], request.get("options"))
+            cache_key, cached = self._cache_lookup(request, request.get("options"))
+            if cached is not None:
+                results[i] = cached
+            else:
+                misses.append((i, call, request, cache_key))
+        
+        responses = self.client.gather([(call.get("kind", "generate"), request) for _, call, request, _ in misses])
+        for (i, call, request, cache_key), response in zip(misses, responses):
+            if isinstance(response, BaseException):
+                results[i] = response
+                continue
+            
+            kind = call.get("kind", "generate")
+            self.note_usage(call.get("task"), request, response, call.get("disability"))
+            text = response['message']['content'] if kind == "chat" else response['response']
+            if cache_key:
+                self.response_cache.put(cache_key, request["model"], text)
+            results[i] = text
+        
+        return results
+    
+    def _fly(self, flight, kind, request, cache_key, task, disability, check=None):
+        """Stream one model call into flight, caching the full text once it completes"""
+        start = time.time()
+        text = ""
+        load_seconds = 0.0
+        chunks = self.client.call(kind, stream=True, **request)
+        try:
+            for chunk in chunks:
+                token = chunk['message']['content'] if kind == "chat" else chunk['response']
+                if token:
+                    text += token
+                    flight.publish(token)
+                if chunk['done']:
+                    self.note_usage(task, request, chunk, disability)
+                    load_seconds = (chunk['load_duration'] or 0) / 1e9
+                if not flight.wanted():
+                    return
+        finally:
+            chunks.close()
+        
+        self.router.record(task, request["model"], time.time() - start, load_seconds)
+        if check is not None and not check(text):
+            return
+        if cache_key:
+            self.response_cache.put(cache_key, request["model"], text)
+    
+    def adaptive_text_processing(self, text, disability_type, stream=False):
+        
+        if disability_type not in ADAPTATION_GUIDES:
+            disability_type = "general"
+        
+        return self._adapt([disability_type], text, stream)
+    
+    def combined_text_processing(self, text, disabilities, stream=False):
+        """Adapt text for several disabilities at once with one merged set of rules"""
+        
+        known = []
+        for disability in disabilities:
+            if disability.lower() in ADAPTATION_GUIDES and disability.lower() not in known:
+                known.append(disability.lower())
+        
+        if len(known) <= 1:
+            return self.adaptive_text_processing(text, known[0] if known else "general", stream=stream)
+        
+        # Sorted, so every student with the same needs shares one prompt prefix
+        return self._adapt(sorted(known), text, stream)
+    
+    def _adapt(self, disabilities, text, stream):
+        """Adapt text, one paragraph chunk at a time when it won't fit the model's context"""
+        system, _ = adaptation_prompt(disabilities, "")
+        model = self.routed_model("text_adaptation", text, system)
+        limit = self.budgets.max_input_chars("text_adaptation", model, system)
+        if len(text) <= limit:
+            return self._adapt_chunk(model, disabilities, text, stream)
+        
+        parts = (self._adapt_chunk(model, disabilities, chunk, stream) for chunk in chunk_paragraphs(text, limit))
+        if not stream:
+            return "\n\n".join(parts)
+        return self._join_streams(parts)
+    
+    def _join_streams(self, streams, separator="\n\n"):
+        for i, tokens in enumerate(streams):
+            if i:
+                yield separator
+            yield from tokens
+    
+    def _adapt_chunk(self, model, disabilities, text, stream):
+        system, prompt = adaptation_prompt(disabilities, text)
+        return self.generate(
+            model,
+            prompt,
             options={
                 "temperature": 0.7,
                 "top_k": 64,
                 "top_p": 0.95
-            }
+            },
+            stream=stream,
+            task="text_adaptation",
+            system=system,
+            disability=disability_label(disabilities)
         )
-        
-        return response['response']
     
-    def visual_learning_aid(self, image, learning_objective):
+    def visual_learning_aid(self, image, learning_objective, stream=False, mode="pipeline",
+                            on_description=None):
+        """
+        Build a learning guide from an image.
         
-     
-        temp_image_path = "temp_learning_image.png"
-        try:
-            image.save(temp_image_path)
-            
-            if self.vision_model:
-                try:
-                    vision_prompt = f"""
-                    Describe this image for a special needs student learning about: {learning_objective}
-                    Be simple, clear, and encouraging.
-                    """
+        mode="single" asks the vision model for the guide directly in one call.
+        mode="pipeline" streams an image description from the vision model and
+        starts the guide on the fast model as soon as that stream ends;
+        on_description receives the description tokens as they arrive.
+        """
+        image_bytes, image_hash = preprocess_image(image)
+        fallback = lambda: self.generate_educational_content(learning_objective, stream=stream)
+        
+        if self.vision_model:
+            try:
+                remembered = self.recall_vision(image_hash, learning_objective, mode)
+                
+                if mode == "single":
+                    if remembered is not None:
+                        return iter([remembered]) if stream else remembered
                     
-                    response = ollama.chat(
-                        model=self.vision_model,
-                        messages=[{
+                    system, prompt = render_prompt("image_guide", objective=learning_objective)
+                    guide = self.chat(
+                        self.select_model("image_guide"),
+                        [{
                             'role': 'user',
-                            'content': vision_prompt,
-                            'images': [temp_image_path]
-                        }]
+                            'content': prompt,
+                            'images': [image_bytes]
+                        }],
+                        options={"temperature": 0.8},
+                        stream=stream,
+                        task="image_guide",
+                        system=system
                     )
                     
-                    image_description = response['message']['content']
+                    if not stream:
+                        self.remember_vision(image_hash, learning_objective, mode, guide)
+                        return guide
                     
-                    return self.create_visual_learning_content(image_description, learning_objective)
-                    
-                except Exception as e:
-                    print(f"Vision model not available: {e}")
-            
-            return self.generate_educational_content(learning_objective)
-            
-        finally:
-            if os.path.exists(temp_image_path):
-                os.remove(temp_image_path)
+                    return self._stream_with_fallback(
+                        self._remember_stream(guide, image_hash, learning_objective, mode),
+                        fallback
+                    )
+                
+                if stream:
+                    # Both stages run inside one wrapped stream, so a vision failure in either falls back
+                    return self._stream_with_fallback(
+                        self._describe_then_guide(image_bytes, image_hash, learning_objective, mode,
+                                                  remembered, on_description),
+                        fallback
+                    )
+                
+                image_description = remembered
+                if image_description is None:
+                    image_description = self.describe_image(image_bytes, learning_objective, on_description)
+                    self.remember_vision(image_hash, learning_objective, mode, image_description)
+                
+                return self.create_visual_learning_content(image_description, learning_objective)
+                
+            except Exception as e:
+                print(f"Vision model not available: {e}")
+        
+        return fallback()
+    
+    def recall_vision(self, image_hash, learning_objective, mode):
+        """Return an earlier vision result for a near-identical image, if any"""
+        with self._vision_memo_lock:
+            for i, entry in enumerate(self.vision_memo):
+                if (entry["objective"] == learning_objective and entry["mode"] == mode and
+                        hamming_distance(entry["hash"], image_hash) <= self.vision_match_bits):
+                    self.vision_memo.append(self.vision_memo.pop(i))
+                    return entry["text"]
+        return None
+    
+    def remember_vision(self, image_hash, learning_objective, mode, text):
+        with self._vision_memo_lock:
+            self.vision_memo.append({
+                "hash": image_hash,
+                "objective": learning_objective,
+                "mode": mode,
+                "text": text
+            })
+            del self.vision_memo[:-self.vision_memo_size]
     
-    def create_visual_learning_content(self, image_description, learning_objective):
+    def _describe_then_guide(self, image_bytes, image_hash, learning_objective, mode, description, on_description):
+        """Pipeline stream: describe the image (tokens go to on_description), then stream the guide"""
+        if description is None:
+            description = self.describe_image(image_bytes, learning_objective, on_description)
+            self.remember_vision(image_hash, learning_objective, mode, description)
+        yield from self.create_visual_learning_content(description, learning_objective, stream=True)
+    
+    def _remember_stream(self, tokens, image_hash, learning_objective, mode):
+        text = ""
+        for token in tokens:
+            text += token
+            yield token
+        self.remember_vision(image_hash, learning_objective, mode, text)
+    
+    def describe_image(self, image_bytes, learning_objective, on_token=None):
+        """Describe an image with the vision model, streaming tokens to on_token"""
+        system, vision_prompt = render_prompt("image_description", objective=learning_objective)
         
-        prompt = f"""
-        Create a special needs learning guide based on this image: {image_description}
-        Learning objective: {learning_objective}
+        messages = [{
+            'role': 'user',
+            'content': vision_prompt,
+            'images': [image_bytes]
+        }]
         
-        Include:
-        1. 📸 What We See (simple description)
-        2. 📚 Learning Points (3-5 bullet points)
-        3. 🌍 Real World Examples (2-3 examples)
-        4. ❓ Check Understanding (2 simple questions)
-        5. 🎨 Fun Activity (1 hands-on activity)
+        model = self.select_model("image_description")
+        if on_token is None:
+            return self.chat(model, messages, task="image_description", system=system)
         
-        Use very simple language and be encouraging!
-        """
+        description = ""
+        for token in self.chat(model, messages, stream=True, task="image_description", system=system):
+            description += token
+            on_token(token)
+        return description
+    
+    def _stream_with_fallback(self, tokens, fallback):
+        """Switch to the fallback stream if the primary fails before its first token"""
+        started = False
+        try:
+            for token in tokens:
+                started = True
+                yield token
+        except Exception as e:
+            if started:
+                raise
+            print(f"Vision model not available: {e}")
+            yield from fallback()
+    
+    def create_visual_learning_content(self, image_description, learning_objective, stream=False):
         
-        response = ollama.generate(
-            model=self.fast_model,
-            prompt=prompt,
-            options={"temperature": 0.8}
+        system, prompt = render_prompt(
+            "visual_guide", objective=learning_objective, description=image_description
         )
         
-        return response['response']
+        return self.generate(
+            self.select_model("visual_guide"),
+            prompt,
+            options={"temperature": 0.8},
+            stream=stream,
+            task="visual_guide",
+            system=system
+        )
     
-    def generate_educational_content(self, learning_objective):
-        
-        prompt = f"""
-        Create an engaging educational guide for special needs students about: {learning_objective}
+    def generate_educational_content(self, learning_objective, stream=False):
         
-        Structure:
-        1. 🎯 What is {learning_objective}? (super simple explanation)
-        2. 📚 Key Things to Know (3-5 points with emojis)
-        3. 🌍 Where We See It (real-life examples)
-        4. ❓ Quick Check (2 yes/no questions)
-        5. 🎮 Fun Activity (something hands-on)
-        
-        Remember: Very simple language, lots of encouragement, use emojis!
-        """
+        system, prompt = render_prompt("educational_content", objective=learning_objective)
         
-        response = ollama.generate(
-            model=self.fast_model,
-            prompt=prompt,
-            options={"temperature": 0.8}
+        return self.generate(
+            self.select_model("educational_content"),
+            prompt,
+            options={"temperature": 0.8},
+            stream=stream,
+            task="educational_content",
+            system=system
         )
+    def attention_monitor(self, interaction_time, attention_span=10):
+        """Monitor attention and suggest breaks; attention_span is in minutes"""
         
-        return response['response']
-    def attention_monitor(self, interaction_time):
-        """Monitor attention and suggest breaks"""
-        
-        if interaction_time > self.student_profile["attention_span"] * 60:
+        if interaction_time > attention_span * 60:
             return {
                 "need_break": True,
                 "suggestion": "Time for a 5-minute movement break! Stand up and stretch.",
@@ -210,80 +2717,70 @@ class EmpowerEdAssistant:
             }
         return {"need_break": False}
         
-    def multi_sensory_lesson(self, topic, disability_types):
-        
-        disabilities_text = ', '.join(disability_types) if disability_types else "general learning needs"
-        
-        prompt = f"""
-        Create a multi-sensory lesson plan for: {topic}
-        Student has: {disabilities_text}
-        
-        Structure the lesson with these sections:
-        
-        🎯 LESSON GOAL
-        - One clear, simple learning objective
-        
-        👀 VISUAL ACTIVITIES
-        - 2-3 things to look at or draw
-        - Simple, clear instructions
-        
-        👂 AUDIO ELEMENTS
-        - Sounds or songs related to {topic}
-        - Rhythm or rhyme to remember key facts
-        
-        🤸 MOVEMENT ACTIVITIES
-        - 2-3 physical activities
-        - Include "Simon Says" style games
-        
-        📝 SIMPLE EXPLANATIONS
-        - Key facts in 5 words or less
-        - Use comparisons to familiar things
-        
-        🎮 INTERACTIVE CHECKPOINTS
-        - "Show me" activities
-        - Yes/no understanding checks
-        
-        😴 SENSORY BREAKS
-        - When: every 5-7 minutes
-        - What: stretching, deep breathing, or quiet time
+    def multi_sensory_lesson(self, topic, disability_types, stream=False, difficulty="Easy"):
         
-        Make everything super engaging and appropriate for {disabilities_text}!
-        """
+        stored = self.library.get("lesson", topic, disability_types, difficulty)
+        if stored is not None:
+            return iter([stored]) if stream else stored
         
-        response = ollama.generate(
-            model=self.accurate_model,
-            prompt=prompt,
-            options={"temperature": 0.8}
+        system, prompt = self.lesson_prompt(topic, disability_types, difficulty)
+        return self._semantic(
+            ("lesson", disability_label(disability_types), difficulty.lower()),
+            topic,
+            lambda: self.generate(
+                self.select_model("lesson"),
+                prompt,
+                options={"temperature": 0.8},
+                stream=stream,
+                task="lesson",
+                system=system,
+                disability=disability_label(disability_types)
+            ),
+            stream
         )
-        
-        return response['response']
     
-    def generate_comprehension_questions(self, text):
-        
-        prompt = f"""
-        Create 3 simple comprehension questions about this text:
-        {text}
-        
-        Requirements:
-        - Use yes/no or multiple choice format
-        - Very simple language
-        - Test basic understanding only
-        - Include encouraging feedback options
+    def lesson_prompt(self, topic, disability_types, difficulty="Easy"):
+        """(system, prompt) for a lesson; the student's needs and level come before the topic"""
+        disabilities_text = ', '.join(disability_types) if disability_types else "general learning needs"
+        return render_prompt("lesson", needs=disabilities_text, level=difficulty, topic=topic)
+    
+    def generate_comprehension_questions(self, text, stream=False):
         
-        Format as:
-        Q1: [Question]
-        Options: a) ... b) ... c) ... d) ...
-        Correct: [letter]
+        instructions = PROMPT_TEMPLATES["comprehension_questions"]["system"]
+        model = self.routed_model("comprehension_questions", text, instructions)
+        limit = self.budgets.max_input_chars("comprehension_questions", model, instructions)
+        if len(text) > limit:
+            text = self.summarize(text, limit)
         
-        Make them appropriate for special needs students.
-        """
+        system, prompt = render_prompt("comprehension_questions", text=text)
         
-        response = ollama.generate(
-            model=self.fast_model,
-            prompt=prompt
+        return self.generate(
+            model,
+            prompt,
+            stream=stream,
+            task="comprehension_questions",
+            system=system
         )
+    
+    def summarize(self, text, max_chars):
+        """Shrink text to at most max_chars by summarizing its chunks concurrently"""
+        system = PROMPT_TEMPLATES["summary"]["system"]
+        model = self.routed_model("summary", text, system)
+        chunks = chunk_paragraphs(text, self.budgets.max_input_chars("summary", model, system))
         
-        return response['response']
+        summaries = self.generate_many([
+            {
+                "model": model,
+                "task": "summary",
+                "system": system,
+                "prompt": render_prompt("summary", text=chunk)[1],
+                "options": {"temperature": 0.3}
+            }
+            for chunk in chunks
+        ])
+        
+        summary = "\n\n".join(part for part in summaries if isinstance(part, str))
+        return summary[:max_chars] or text[:max_chars]
     
     def generate_break_activity(self):
         """Generate appropriate break activities"""
@@ -300,18 +2797,32 @@ class EmpowerEdAssistant:
         
         return np.random.choice(activities)
 
-def save_profile_to_file(profile_data):
-    """Save profile to JSON file for persistence"""
-    with open("student_profile.json", "w") as f:
-        json.dump(profile_data, f, indent=2)
+def parse_keep_alive(value):
+    """Ollama takes keep_alive as seconds (-1 = forever) or a duration like 30m"""
+    return int(value) if re.fullmatch(r"-?\d+", value.strip()) else value.strip()
 
-def load_profile_from_file():
+@st.cache_resource
+def get_assistant():
+    """One assistant, and so one Ollama connection pool, shared by every session.
+    
+    Set EMPOWERED_WARMUP=1 to preload the models when the first session opens, pinned
+    for EMPOWERED_KEEP_ALIVE (default -1, i.e. until Ollama restarts). Set
+    EMPOWERED_METRICS_PORT to serve per-call model metrics at /metrics.
+    """
+    assistant = EmpowerEdAssistant()
+    if os.environ.get("EMPOWERED_METRICS_PORT"):
+        try:
+            assistant.metrics.serve(int(os.environ["EMPOWERED_METRICS_PORT"]))
+        except (OSError, ValueError) as e:
+            print(f"Could not serve metrics: {e}")
+    if os.environ.get("EMPOWERED_WARMUP", "").lower() in ("1", "true", "yes"):
+        keep_alive = parse_keep_alive(os.environ.get("EMPOWERED_KEEP_ALIVE", "-1"))
+        assistant.background.submit(assistant.warm_up, keep_alive)
+    return assistant
 
-    try:
-        with open("student_profile.json", "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return None
+def current_student_id():
+    """The student this browser session is learning as"""
+    return st.session_state.get("student_id", DEFAULT_STUDENT)
 
 def save_progress(topic, time_spent, quiz_score=None, activity_type="lesson"):
     """Save learning progress"""
@@ -321,24 +2832,92 @@ def save_progress(topic, time_spent, quiz_score=None, activity_type="lesson"):
         "time_spent": round(time_spent, 2),
         "quiz_score": quiz_score,
         "activity_type": activity_type,
-        "disabilities": st.session_state.assistant.student_profile.get("disabilities", [])
+        "disabilities": st.session_state.student_profile.get("disabilities", [])
     }
     
-    with open("progress_student.json", "a") as f:
-        json.dump(progress_entry, f)
-        f.write("\n")
+    get_progress_store().add_progress(progress_entry, current_student_id())
 
 def load_progress_history():
-    """Load progress history from file"""
-    try:
-        history = []
-        with open("progress_student.json", "r") as f:
-            for line in f:
-                if line.strip():
-                    history.append(json.loads(line.strip()))
-        return history
-    except FileNotFoundError:
-        return []
+    """Load the current student's progress history from the progress store"""
+    return get_progress_store().history(current_student_id())
+
+def streaming_enabled():
+    """Whether answers should be shown while they are being written"""
+    return st.session_state.get("stream_output", True)
+
+def stream_to_placeholder(token_stream, render=None):
+    """Render a token stream into a single placeholder and return the full text"""
+    placeholder = st.empty()
+    render = render or (lambda box, text: box.markdown(text))
+    
+    if st.session_state.get("speak_streams"):
+        token_stream = speech.speak_stream(token_stream, speech_session())
+    
+    text = ""
+    for token in token_stream:
+        text += token
+        render(placeholder, text + " ▌")
+    
+    render(placeholder, text)
+    return text
+
+def stream_side_by_side(streams, render):
+    """Consume several token streams concurrently, each rendered in its own column.
+    
+    streams maps a column label to its token generator; render(label, box, text)
+    draws the text so far. Returns the full text per label.
+    """
+    updates = queue.Queue()
+    
+    def pump(label, tokens):
+        try:
+            for token in tokens:
+                updates.put((label, token))
+        except Exception as e:
+            updates.put((label, f"\n\n⚠️ {e}"))
+        finally:
+            updates.put((label, None))
+    
+    placeholders = {}
+    for column, label in zip(st.columns(len(streams)), streams):
+        column.markdown(f"**{label}**")
+        placeholders[label] = column.empty()
+    
+    # Workers only produce tokens; all Streamlit writes stay on the script thread
+    for label, tokens in streams.items():
+        threading.Thread(target=pump, args=(label, tokens), daemon=True).start()
+    
+    texts = {label: "" for label in streams}
+    remaining = len(streams)
+    while remaining:
+        label, token = updates.get()
+        if token is None:
+            remaining -= 1
+            render(label, placeholders[label], texts[label])
+        else:
+            texts[label] += token
+            render(label, placeholders[label], texts[label] + " ▌")
+    
+    return texts
+
+def dyslexia_friendly_html(text):
+    """Wrap text in the dyslexia-friendly reading box"""
+    return f'''
+                        <div style="
+                            background-color: #FFFBF0;
+                            padding: 20px;
+                            border-radius: 10px;
+                            border-left: 4px solid #4CAF50;
+                            font-family: 'Comic Neue', Arial, sans-serif;
+                            font-size: 1.1rem;
+                            line-height: 1.8;
+                            letter-spacing: 0.05em;
+                            word-spacing: 0.1em;
+                            color: #2c3e50;
+                        ">
+                        {text}
+                        </div>
+                        '''
 
 def apply_visual_preferences(visual_mode):
     """Apply visual preferences dynamically"""
@@ -444,9 +3023,9 @@ def apply_visual_preferences(visual_mode):
 
 def show_active_accommodations():
     """Display active accommodations based on profile"""
-    if st.session_state.assistant.student_profile.get("disabilities"):
+    if st.session_state.student_profile.get("disabilities"):
         with st.expander("🛡️ Your Active Learning Supports"):
-            disabilities = st.session_state.assistant.student_profile.get("disabilities", [])
+            disabilities = st.session_state.student_profile.get("disabilities", [])
             
             cols = st.columns(2)
             
@@ -488,6 +3067,56 @@ def show_active_accommodations():
                     st.write("• Simplified interactions")
                     st.write("• Voice control options")
 
+def student_selector():
+    """Sidebar picker for who is learning, switching the session's profile"""
+    profiles = get_profile_store()
+    students = profiles.students()
+    student_ids = [student_id for student_id, _ in students]
+    current = current_student_id()
+    
+    student_id = st.selectbox(
+        "👥 Who is learning?",
+        student_ids,
+        index=student_ids.index(current) if current in student_ids else 0,
+        format_func=profiles.name
+    )
+    
+    if student_id != st.session_state.get("student_id"):
+        st.session_state.student_id = student_id
+        st.session_state.student_profile = profiles.get(student_id)
+    
+    with st.expander("➕ Add a student"):
+        name = st.text_input("Name", key="new_student_name")
+        if st.button("Add", key="add_student") and name.strip():
+            st.session_state.student_id = profiles.add_student(name)
+            st.session_state.student_profile = profiles.get(st.session_state.student_id)
+            st.experimental_rerun()
+
+def teacher_mode():
+    """Whether this browser session has unlocked the teacher tools"""
+    return st.session_state.get("teacher_mode", False)
+
+def teacher_login():
+    """Sidebar passcode box for the teacher tools, shown only when EMPOWERED_TEACHER_PASSCODE is set"""
+    passcode = os.environ.get("EMPOWERED_TEACHER_PASSCODE")
+    if not passcode:
+        return
+    
+    with st.expander("🔒 Teacher"):
+        if teacher_mode():
+            st.caption("Teacher tools are unlocked in this browser.")
+            if st.button("Lock", key="teacher_lock"):
+                st.session_state.teacher_mode = False
+                st.experimental_rerun()
+        else:
+            entered = st.text_input("Passcode", type="password", key="teacher_passcode")
+            if st.button("Unlock", key="teacher_unlock"):
+                if hmac.compare_digest(entered.encode("utf-8"), passcode.encode("utf-8")):
+                    st.session_state.teacher_mode = True
+                    st.experimental_rerun()
+                else:
+                    st.error("That passcode isn't right.")
+
 def create_ui():
     """Main Streamlit UI"""
     
@@ -498,7 +3127,7 @@ def create_ui():
     )
     
     if 'assistant' not in st.session_state:
-        st.session_state.assistant = EmpowerEdAssistant()
+        st.session_state.assistant = get_assistant()
     
     if 'start_time' not in st.session_state:
         st.session_state.start_time = time.time()
@@ -506,7 +3135,12 @@ def create_ui():
     if 'session_start' not in st.session_state:
         st.session_state.session_start = time.time()
     
-    visual_pref = st.session_state.assistant.student_profile.get("visual_preference", "normal")
+    # Pick the student before anything reads the profile
+    with st.sidebar:
+        student_selector()
+        teacher_login()
+    
+    visual_pref = st.session_state.student_profile.get("visual_preference", "normal")
     apply_visual_preferences(visual_pref.replace("_", " ").title())
     
     col1, col2, col3 = st.columns([2, 1, 1])
@@ -520,7 +3154,9 @@ def create_ui():
         st.metric("⏱️ Learning Time", f"{elapsed//60}:{elapsed%60:02d}")
     
     with col3:
-        attention_check = st.session_state.assistant.attention_monitor(elapsed)
+        attention_check = st.session_state.assistant.attention_monitor(
+            elapsed, st.session_state.student_profile.get("attention_span", 10)
+        )
         if attention_check["need_break"]:
             st.warning("🎯 Break Time!")
             st.info(attention_check["activity"])
@@ -532,19 +3168,11 @@ def create_ui():
     with st.sidebar:
         st.header("👤 My Learning Profile")
         
-        # Load saved profile on startup
-        if 'profile_loaded' not in st.session_state:
-            saved_profile = load_profile_from_file()
-            if saved_profile:
-                st.session_state.assistant.student_profile = saved_profile
-                st.session_state.profile_loaded = True
-        
         st.subheader("My Learning Needs")
         disabilities = st.multiselect(
             "Select all that apply:",
-            ["Dyslexia", "ADHD", "Autism", "Visual Impairment", 
-             "Hearing Impairment", "Motor Difficulties"],
-            default=st.session_state.assistant.student_profile.get("disabilities", [])
+            DISABILITY_OPTIONS,
+            default=st.session_state.student_profile.get("disabilities", [])
         )
         
         st.subheader("My Preferences")
@@ -552,16 +3180,30 @@ def create_ui():
         reading_speed = st.select_slider(
             "Reading Speed",
             options=["Very Slow", "Slow", "Medium", "Fast"],
-            value=st.session_state.assistant.student_profile.get("reading_speed", "slow").title()
+            value=st.session_state.student_profile.get("reading_speed", "slow").title()
         )
         
         use_audio = st.checkbox(
             "🔊 Read text aloud to me", 
-            value=st.session_state.assistant.student_profile.get("audio_preference", True)
+            value=st.session_state.student_profile.get("audio_preference", True)
         )
         
+        if use_audio:
+            st.session_state.speak_streams = st.checkbox(
+                "🗣️ Read new answers aloud as they appear",
+                value=st.session_state.get("speak_streams", False)
+            )
+        else:
+            st.session_state.speak_streams = False
+        
+        stop_col, skip_col = st.columns(2)
+        if stop_col.button("⏹️ Stop", key="stop_speech", use_container_width=True):
+            speech.stop(speech_session())
+        if skip_col.button("⏭️ Skip", key="skip_sentence", use_container_width=True):
+            speech.skip(speech_session())
+        
        
-        current_pref = st.session_state.assistant.student_profile.get("visual_preference", "normal")
+        current_pref = st.session_state.student_profile.get("visual_preference", "normal")
 
         pref_mapping = {
             "normal": 0,
@@ -579,6 +3221,11 @@ def create_ui():
             index=pref_index
         )
         
+        st.session_state.stream_output = st.checkbox(
+            "⚡ Show answers as they are written",
+            value=st.session_state.get("stream_output", True)
+        )
+        
         if st.button("💾 Save My Profile", key="save_profile", type="primary"):
             profile_data = {
                 "disabilities": disabilities,
@@ -589,24 +3236,169 @@ def create_ui():
                 "learning_style": "visual"
             }
             
-            st.session_state.assistant.student_profile = profile_data
+            st.session_state.student_profile = profile_data
             
-            save_profile_to_file(profile_data)
+            get_profile_store().save(current_student_id(), profile_data)
             
             st.success("✅ Profile saved!")
             
             apply_visual_preferences(visual_mode)
             
             st.experimental_rerun()
+        with st.expander("⚡ Speed Stats"):
+            cache = st.session_state.assistant.response_cache
+            cache_stats = cache.stats()
+            
+            hit_col, miss_col = st.columns(2)
+            hit_col.metric("♻️ Reused", cache_stats["hits"])
+            miss_col.metric("🆕 Generated", cache_stats["misses"])
+            st.caption(
+                f"Hit rate {cache_stats['hit_rate']:.0%} · {cache_stats['entries']} saved answers "
+                f"({cache_stats['bytes'] / 1024:.0f} KB)"
+            )
+            
+            semantic = st.session_state.assistant.semantic_cache
+            semantic_stats = semantic.stats()
+            if semantic_stats["lookups"]:
+                st.caption(
+                    f"🔎 {semantic_stats['hits']} of {semantic_stats['lookups']} lessons "
+                    f"matched an earlier one ({semantic_stats['hit_rate']:.0%}), "
+                    f"saving {semantic_stats['seconds_saved']:.0f}s"
+                )
+            
+            library = st.session_state.assistant.library.stats()
+            if library["hits"]:
+                st.caption(
+                    f"📚 {library['hits']} lessons and question sets came ready-made from the library "
+                    f"({library['entries']} prepared)"
+                )
+            
+            flights = st.session_state.assistant.flights.stats()
+            if flights["shared"]:
+                st.caption(
+                    f"🤝 {flights['shared']} requests joined an answer already being written "
+                    f"({flights['share_rate']:.0%} of model requests)"
+                )
+            
+            practice = st.session_state.assistant.practice_metrics
+            if practice["generations"]:
+                st.caption(
+                    f"🎲 Practice questions: {practice['parse_failures']} parse failures, "
+                    f"{practice['invalid_items']} invalid items and {practice['retries']} retries "
+                    f"in {practice['generations']} generations"
+                )
+            
+            for entry in st.session_state.assistant.budgets.log[-3:]:
+                st.caption(
+                    f"🧮 {entry['task']}: {entry['tokens_in']} tokens in → {entry['tokens_out']} out "
+                    f"at {entry['tokens_per_second'] or 0} tok/s"
+                )
+            
+            # One assistant serves every session, so these settings are the teacher's to change
+            if teacher_mode():
+                st.caption("👩‍🏫 These settings apply to every student on this server")
+                st.checkbox(
+                    "🎲 Always write fresh answers",
+                    value=not cache.cache_sampled,
+                    key="fresh_answers",
+                    help="Skip saved answers for creative (non-zero temperature) requests",
+                    on_change=lambda: setattr(cache, "cache_sampled", not st.session_state.fresh_answers)
+                )
+                st.slider(
+                    "🔎 How close a lesson topic must be to reuse an earlier lesson",
+                    min_value=0.80,
+                    max_value=1.0,
+                    value=semantic.thresholds.get("lesson", semantic.default_threshold),
+                    step=0.01,
+                    key="lesson_match",
+                    help="1.0 only reuses a lesson for the very same topic",
+                    on_change=lambda: semantic.thresholds.update(lesson=st.session_state.lesson_match)
+                )
+                
+                if st.button("🧹 Clear saved answers", key="clear_cache"):
+                    cache.clear()
+                    semantic.clear()
+                    st.success("✅ Saved answers cleared!")
+        
+        with st.expander("🔥 Models"):
+            assistant = st.session_state.assistant
+            loaded = assistant.client.loaded_models()
+            
+            for model in assistant.models():
+                status = assistant.warmup_status.get(model)
+                if model in loaded:
+                    st.write(f"✅ **{model}** is warm")
+                elif status == "warming":
+                    st.write(f"⏳ **{model}** is loading…")
+                else:
+                    st.write(f"❄️ **{model}** is cold")
+                if status and status != "warming":
+                    st.caption(status)
+            
+            if st.button("🔥 Warm up models", key="warm_up"):
+                assistant.background.submit(assistant.warm_up, parse_keep_alive(
+                    os.environ.get("EMPOWERED_KEEP_ALIVE", "-1")
+                ))
+                st.info("⏳ Loading models in the background…")
+            
+            residency = assistant.client.residency.stats()
+            st.caption(
+                f"🧠 {residency['resident_gb']} of {residency['budget_gb']} GB in use · "
+                f"hit rate {residency['hit_rate']:.0%} ({residency['misses']} loads) · "
+                f"{residency['reroutes']} requests moved to a loaded model"
+            )
+            for event in reversed(residency["events"][-5:]):
+                st.caption(f"{event['time'][11:]} {event['event']} {event['model']}")
+            
+            for row in assistant.router.stats():
+                if row["samples"]:
+                    st.caption(
+                        f"⏱️ {row['task']} on {row['model']}: p50 {row['p50']:.1f}s · "
+                        f"p95 {row['p95']:.1f}s ({row['samples']} calls)"
+                    )
+        
+        with st.expander("📈 Model Metrics"):
+            metrics = st.session_state.assistant.metrics
+            rows = metrics.summary()
+            if not rows:
+                st.caption("No model calls yet.")
+            else:
+                st.caption("Average milliseconds per call: model load, prompt eval and writing the answer")
+                st.dataframe(
+                    [{"task": row["task"], "model": row["model"], "calls": row["calls"],
+                      "load": row["load_ms"], "prompt": row["prompt_eval_ms"], "decode": row["eval_ms"],
+                      "total": row["total_ms"], "stalls": row["load_stalls"]} for row in rows],
+                    hide_index=True,
+                    use_container_width=True
+                )
+            
+            stalls = [entry for entry in metrics.recent if entry["load_stall"]]
+            for entry in reversed(stalls[-3:]):
+                st.caption(
+                    f"🐢 {entry['time'][11:]} {entry['task']} waited {entry['load_seconds']:.1f}s "
+                    f"for {entry['model']} to load"
+                )
+            
+            st.download_button(
+                "⬇️ Prometheus snapshot",
+                metrics.prometheus(),
+                file_name="empowered_metrics.txt",
+                key="download_metrics"
+            )
+        
         with st.expander("📋 Profile Summary"):
-            profile = st.session_state.assistant.student_profile
+            profile = st.session_state.student_profile
             st.json(profile)
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab_names = [
         "📚 Reading Helper", 
         "🎨 Visual Learning", 
         "🎯 Interactive Lessons",
         "📊 My Progress"
-    ])
+    ]
+    # Classmates' names, scores and needs are for the teacher's eyes only
+    if teacher_mode():
+        tab_names.append("👩‍🏫 Class Overview")
+    tab1, tab2, tab3, tab4, *teacher_tabs = st.tabs(tab_names)
     
     with tab1:
         reading_helper_tab()
@@ -619,6 +3411,10 @@ def create_ui():
     
     with tab4:
         progress_tracker_tab()
+    
+    if teacher_tabs:
+        with teacher_tabs[0]:
+            class_overview_tab()
 def reading_helper_tab():
     """
     🤖 AI HELPS HERE: 
@@ -640,41 +3436,59 @@ def reading_helper_tab():
         
         if text_input:
             
-            disabilities = st.session_state.assistant.student_profile.get("disabilities", [])
+            disabilities = st.session_state.student_profile.get("disabilities", [])
             
             if disabilities:
                
-                primary_disability = disabilities[0].lower()
-                with st.spinner(f"Adapting text for {disabilities[0]}..."):
-                    processed_text = st.session_state.assistant.adaptive_text_processing(
-                        text_input, primary_disability
-                    )
-                
-                st.subheader("📖 Adapted Text:")
+                side_by_side = False
+                if len(disabilities) > 1:
+                    side_by_side = st.radio(
+                        "How should I adapt it?",
+                        ["🧩 One version for all my needs", "🪟 One version per need, side by side"],
+                        horizontal=True,
+                        key="adapt_mode"
+                    ) != "🧩 One version for all my needs"
                 
                 if "Dyslexia" in disabilities:
-                  
-                    st.markdown(
-                        f'''
-                        <div style="
-                            background-color: #FFFBF0;
-                            padding: 20px;
-                            border-radius: 10px;
-                            border-left: 4px solid #4CAF50;
-                            font-family: 'Comic Neue', Arial, sans-serif;
-                            font-size: 1.1rem;
-                            line-height: 1.8;
-                            letter-spacing: 0.05em;
-                            word-spacing: 0.1em;
-                            color: #2c3e50;
-                        ">
-                        {processed_text}
-                        </div>
-                        ''',
-                        unsafe_allow_html=True
+                    render = lambda box, text: box.markdown(dyslexia_friendly_html(text), unsafe_allow_html=True)
+                else:
+                    render = lambda box, text: box.info(text)
+                
+                if side_by_side:
+                    st.subheader("📖 Adapted Text:")
+                    
+                    variants = {}
+                    for disability in disabilities:
+                        profile = disability.lower() if disability.lower() in ADAPTATION_GUIDES else "general"
+                        label = disability if profile != "general" else "General"
+                        if label not in variants:
+                            variants[label] = st.session_state.assistant.adaptive_text_processing(
+                                text_input, profile, stream=True
+                            )
+                    
+                    stream_side_by_side(
+                        variants,
+                        lambda label, box, text: (
+                            box.markdown(dyslexia_friendly_html(text), unsafe_allow_html=True)
+                            if label == "Dyslexia" else box.info(text)
+                        )
+                    )
+                elif streaming_enabled():
+                    st.subheader("📖 Adapted Text:")
+                    stream_to_placeholder(
+                        st.session_state.assistant.combined_text_processing(
+                            text_input, disabilities, stream=True
+                        ),
+                        render
                     )
                 else:
-                    st.info(processed_text)
+                    with st.spinner(f"Adapting text for {', '.join(disabilities)}..."):
+                        processed_text = st.session_state.assistant.combined_text_processing(
+                            text_input, disabilities
+                        )
+                    
+                    st.subheader("📖 Adapted Text:")
+                    render(st.empty(), processed_text)
             else:
                 st.write(text_input)
     
@@ -683,34 +3497,48 @@ def reading_helper_tab():
         
         if text_input:
             if st.button("🔊 Read Aloud", key="read_aloud", use_container_width=True):
-                with st.spinner("Reading..."):
-                    engine.say(text_input)
-                    engine.runAndWait()
-                st.success("✅ Done reading!")
+                speech.say(text_input, speech_session())
+                st.success("🔊 Reading aloud...")
             
             if st.button("📝 Simplify Text", key="simplify", use_container_width=True):
                 start_time = time.time()
-                with st.spinner("Simplifying..."):
-                    simplified = st.session_state.assistant.adaptive_text_processing(
-                        text_input, "general"
+                if streaming_enabled():
+                    st.write("Simplified version:")
+                    stream_to_placeholder(
+                        st.session_state.assistant.adaptive_text_processing(
+                            text_input, "general", stream=True
+                        ),
+                        lambda box, text: box.text_area("Simplified version:", text, height=200,
+                                                        label_visibility="collapsed")
                     )
-                
-                st.text_area("Simplified version:", simplified, height=200)
+                else:
+                    with st.spinner("Simplifying..."):
+                        simplified = st.session_state.assistant.adaptive_text_processing(
+                            text_input, "general"
+                        )
+                    
+                    st.text_area("Simplified version:", simplified, height=200)
                 
                 time_spent = (time.time() - start_time) / 60
                 save_progress("Reading Practice", time_spent, activity_type="reading")
             
             if st.button("❓ Check Understanding", key="check_understanding", use_container_width=True):
-                with st.spinner("Creating questions..."):
-                    questions = st.session_state.assistant.generate_comprehension_questions(text_input)
-                
-                st.write("### 🧠 Quick Check:")
-                st.info(questions)
+                if streaming_enabled():
+                    st.write("### 🧠 Quick Check:")
+                    questions = stream_to_placeholder(
+                        st.session_state.assistant.generate_comprehension_questions(text_input, stream=True),
+                        lambda box, text: box.info(text)
+                    )
+                else:
+                    with st.spinner("Creating questions..."):
+                        questions = st.session_state.assistant.generate_comprehension_questions(text_input)
+                    
+                    st.write("### 🧠 Quick Check:")
+                    st.info(questions)
                 
-                if st.session_state.assistant.student_profile.get("audio_preference"):
+                if st.session_state.student_profile.get("audio_preference"):
                     if st.button("🔊 Read Questions", key="read_questions"):
-                        engine.say(questions)
-                        engine.runAndWait()
+                        speech.say(questions, speech_session())
 
 def visual_learning_tab():
     """
@@ -739,6 +3567,16 @@ def visual_learning_tab():
             placeholder="e.g., 'counting objects', 'identifying shapes', 'colors'",
             key="learning_objective"
         )
+        
+        guide_style = st.radio(
+            "Guide style",
+            ["⚡ Quick guide", "🔍 Detailed guide"],
+            horizontal=True,
+            key="guide_style",
+            help="Quick asks the vision model for the guide in one step. "
+                 "Detailed describes the picture first, then writes the guide."
+        )
+        guide_mode = "single" if guide_style == "⚡ Quick guide" else "pipeline"
     
     with col2:
         if uploaded_file or camera_image:
@@ -748,16 +3586,38 @@ def visual_learning_tab():
             if st.button("🧠 Create Learning Guide", key="explain_image", type="primary"):
                 start_time = time.time()
                 
-                with st.spinner("Creating your learning guide..."):
-                    explanation = st.session_state.assistant.visual_learning_aid(
+                if streaming_enabled():
+                    st.write("### 📚 Your Learning Guide:")
+                    looking = st.empty()
+                    described = []
+                    
+                    def on_description(token):
+                        described.append(token)
+                        looking.caption("👀 " + "".join(described))
+                    
+                    guide_stream = st.session_state.assistant.visual_learning_aid(
                         image,
-                        learning_objective or "general learning"
+                        learning_objective or "general learning",
+                        stream=True,
+                        mode=guide_mode,
+                        on_description=on_description
                     )
                     
+                    explanation = stream_to_placeholder(guide_stream, lambda box, text: box.success(text))
+                    looking.empty()
                     st.session_state['current_explanation'] = explanation
-                
-                st.write("### 📚 Your Learning Guide:")
-                st.success(explanation)
+                else:
+                    with st.spinner("Creating your learning guide..."):
+                        explanation = st.session_state.assistant.visual_learning_aid(
+                            image,
+                            learning_objective or "general learning",
+                            mode=guide_mode
+                        )
+                        
+                        st.session_state['current_explanation'] = explanation
+                    
+                    st.write("### 📚 Your Learning Guide:")
+                    st.success(explanation)
                 
                 # Track progress
                 time_spent = (time.time() - start_time) / 60
@@ -766,13 +3626,11 @@ def visual_learning_tab():
             
             # Audio option
             if ('current_explanation' in st.session_state and 
-                st.session_state.assistant.student_profile.get("audio_preference")):
+                st.session_state.student_profile.get("audio_preference")):
                 
                 if st.button("🔊 Listen to Guide", key="listen_explanation"):
-                    with st.spinner("Reading aloud..."):
-                        engine.say(st.session_state['current_explanation'])
-                        engine.runAndWait()
-                    st.success("✅ Done!")
+                    speech.say(st.session_state['current_explanation'], speech_session())
+                    st.success("🔊 Reading aloud...")
 
 def interactive_lessons_tab():
     """
@@ -789,32 +3647,61 @@ def interactive_lessons_tab():
     with col1:
         topic = st.text_input(
             "What would you like to learn today?",
-            placeholder="e.g., 'numbers 1-10', 'colors', 'emotions', 'animals'",
+            placeholder="e.g., " + ", ".join(f"'{topic}'" for topic in STARTER_TOPICS),
             key="lesson_topic"
         )
     
     with col2:
         difficulty = st.selectbox(
             "Level",
-            ["Beginner", "Easy", "Medium", "Challenging"],
+            LESSON_DIFFICULTIES,
             key="difficulty_level"
         )
     
+    # Practice questions prefetched for a different topic are no longer wanted
+    prefetch = st.session_state.get('practice_prefetch')
+    if prefetch and prefetch.key[:2] != (topic, difficulty):
+        prefetch.cancel()
+        st.session_state.pop('practice_prefetch')
+    
     if topic and st.button("🚀 Create My Lesson", key="create_lesson", type="primary"):
         lesson_start = time.time()
         
-        with st.spinner("Creating your personalized lesson..."):
-            
-            st.session_state['current_topic'] = topic
-            st.session_state['current_difficulty'] = difficulty
+        st.session_state['current_topic'] = topic
+        st.session_state['current_difficulty'] = difficulty
+        
+        disabilities = st.session_state.student_profile.get("disabilities", ["general"])
+        
+        # Start the practice questions now so they are ready when the lesson is done
+        if 'practice_prefetch' in st.session_state:
+            st.session_state.pop('practice_prefetch').cancel()
+        st.session_state['practice_prefetch'] = st.session_state.assistant.prefetch(
+            (topic, difficulty, tuple(disabilities)),
+            generate_practice_questions,
+            topic, difficulty, disabilities,
+            assistant=st.session_state.assistant
+        )
+        
+        if streaming_enabled():
+            st.markdown("---")
+            st.subheader(f"📖 Today's Lesson: {topic}")
             
-            disabilities = st.session_state.assistant.student_profile.get("disabilities", ["general"])
-            lesson = st.session_state.assistant.multi_sensory_lesson(topic, disabilities)
+            draft = st.empty()
+            with draft.container():
+                lesson = stream_to_placeholder(
+                    st.session_state.assistant.multi_sensory_lesson(
+                        topic, disabilities, stream=True, difficulty=difficulty
+                    )
+                )
+            draft.empty()
+        else:
+            with st.spinner("Creating your personalized lesson..."):
+                lesson = st.session_state.assistant.multi_sensory_lesson(topic, disabilities, difficulty=difficulty)
             
-            st.session_state['current_lesson'] = lesson
+            st.markdown("---")
+            st.subheader(f"📖 Today's Lesson: {topic}")
         
-        st.markdown("---")
-        st.subheader(f"📖 Today's Lesson: {topic}")
+        st.session_state['current_lesson'] = lesson
         
         sections = lesson.split("\n\n")
         for i, section in enumerate(sections):
@@ -831,6 +3718,16 @@ def interactive_lessons_tab():
                             st.balloons()
                             st.success("🌟 Fantastic work!")
         
+        # Prepared overnight with the lesson, so showing them costs nothing. They only match a
+        # stored lesson, and a live one must not count as a library miss a second time
+        library = st.session_state.assistant.library
+        check_questions = None
+        if library.get("lesson", topic, disabilities, difficulty, count=False) == lesson:
+            check_questions = library.get("comprehension_questions", topic, disabilities, difficulty)
+        if check_questions:
+            with st.expander("❓ Check your understanding"):
+                st.write(check_questions)
+        
         time_spent = (time.time() - lesson_start) / 60
         save_progress(topic, time_spent, activity_type="lesson")
     
@@ -841,24 +3738,78 @@ def interactive_lessons_tab():
         st.info("👆 Create a lesson first, then practice here!")
     else:
         if st.button("🎲 Generate Practice Questions", key="generate_practice"):
-            with st.spinner("Creating fun practice questions..."):
-                questions = generate_practice_questions(
-                    st.session_state['current_topic'],
-                    st.session_state.get('current_difficulty', 'Easy'),
-                    st.session_state.assistant.student_profile.get("disabilities", [])
-                )
-                
-                st.session_state['practice_questions'] = questions
-                st.session_state['current_question_index'] = 0
-                st.session_state['score'] = 0
+            practice_disabilities = st.session_state.student_profile.get("disabilities", ["general"])
+            practice_key = (
+                st.session_state['current_topic'],
+                st.session_state.get('current_difficulty', 'Easy'),
+                tuple(practice_disabilities)
+            )
+            prefetch = st.session_state.pop('practice_prefetch', None)
+            questions = None
+            
+            if prefetch and prefetch.key == practice_key:
+                with st.spinner("Almost ready..."):
+                    questions = prefetch.result()
+            elif prefetch:
+                prefetch.cancel()
+            
+            if questions is None:
+                with st.spinner("Creating fun practice questions..."):
+                    on_token = None
+                    if streaming_enabled():
+                        progress = st.empty()
+                        written = []
+                        def on_token(token):
+                            written.append(token)
+                            progress.caption(f"✏️ Writing questions... {len(written)} pieces so far")
+                    
+                    questions = generate_practice_questions(
+                        *practice_key[:2],
+                        practice_disabilities,
+                        on_token=on_token
+                    )
+                    
+                    if on_token:
+                        progress.empty()
+            
+            st.session_state['practice_questions'] = questions
+            st.session_state['current_question_index'] = 0
+            st.session_state['score'] = 0
         
         if 'practice_questions' in st.session_state:
             display_practice_interface()
 
-def generate_practice_questions(topic, difficulty, disabilities):
-    """
-    🤖 AI HELPS HERE: Generates adaptive practice questions
-    """
+PRACTICE_QUESTION_TYPES = ["multiple_choice", "yes_no", "true_false"]
+
+PRACTICE_QUESTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "type": {"type": "string", "enum": PRACTICE_QUESTION_TYPES},
+                    "options": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "minItems": 2,
+                        "maxItems": 4
+                    },
+                    "correct_answer": {"type": "string"},
+                    "feedback": {"type": "string"},
+                    "success_message": {"type": "string"}
+                },
+                "required": ["question", "type", "options", "correct_answer", "feedback", "success_message"]
+            }
+        }
+    },
+    "required": ["questions"]
+}
+
+def practice_questions_prompt(topic, difficulty, disabilities, count=3, existing=None):
+    """(system, prompt) asking for adaptive practice questions as a JSON object"""
     
     adaptations = []
     if "Visual Impairment" in disabilities:
@@ -868,71 +3819,176 @@ def generate_practice_questions(topic, difficulty, disabilities):
     if "ADHD" in disabilities:
         adaptations.append("engaging, quick to answer")
     
-    prompt = f"""
-    Create 3 practice questions about: {topic}
-    Difficulty: {difficulty}
-    Adaptations needed: {', '.join(adaptations) if adaptations else 'general special needs'}
-    
-    Return a JSON array with exactly 3 questions:
-    [{{
-        "question": "Simple question text",
-        "type": "multiple_choice",
-        "options": ["Option A", "Option B", "Option C", "Option D"],
-        "correct_answer": "Option A",
-        "feedback": "Try again! Hint: ...",
-        "success_message": "Great job! You got it!"
-    }}]
-    
-    Make questions fun, encouraging, and appropriate for special needs students.
-    """
+    avoid = ""
+    if existing:
+        avoid = "Do not repeat these questions: " + "; ".join(existing) + "\n"
     
+    return render_prompt(
+        "practice_questions",
+        adaptations=', '.join(adaptations) if adaptations else 'general special needs',
+        difficulty=difficulty,
+        count=count,
+        avoid=avoid,
+        topic=topic
+    )
+
+def parse_practice_questions(response_text):
+    """Return the list of question dicts in a model response; raises ValueError if there is none"""
     try:
-        response = ollama.generate(
-            model=st.session_state.assistant.fast_model,
-            prompt=prompt,
-            options={"temperature": 0.7}
-        )
-        
-        # Extract JSON from response
-        response_text = response['response']
+        data = json.loads(response_text)
+    except json.JSONDecodeError:
+        # Older models may still wrap the array in prose
         json_start = response_text.find('[')
         json_end = response_text.rfind(']') + 1
-        
-        if json_start != -1 and json_end != 0:
-            json_str = response_text[json_start:json_end]
-            return json.loads(json_str)
-        else:
+        if json_start == -1 or json_end == 0:
             raise ValueError("No valid JSON found")
+        data = json.loads(response_text[json_start:json_end])
+    
+    if isinstance(data, dict):
+        data = data.get("questions")
+    if not isinstance(data, list):
+        raise ValueError("Response has no question list")
+    return data
+
+def is_valid_practice_question(question):
+    """Check a question has every field the practice interface needs"""
+    if not isinstance(question, dict):
+        return False
+    
+    for field in ("question", "type", "correct_answer", "feedback", "success_message"):
+        if not isinstance(question.get(field), str) or not question[field].strip():
+            return False
+    
+    if question["type"] not in PRACTICE_QUESTION_TYPES:
+        return False
+    if question["type"] == "true_false":
+        return question["correct_answer"].strip().lower() in ("true", "false")
+    
+    options = question.get("options")
+    if not isinstance(options, list) or len(options) < 2:
+        return False
+    if not all(isinstance(option, str) and option.strip() for option in options):
+        return False
+    return question["correct_answer"] in options
+
+def generate_practice_questions(topic, difficulty, disabilities, on_token=None, assistant=None,
+                                cancel_event=None, count=3, max_retries=2):
+    """
+    🤖 AI HELPS HERE: Generates adaptive practice questions
+    
+    The model is constrained to PRACTICE_QUESTIONS_SCHEMA. Invalid or missing
+    questions are requested again (only the missing ones) up to max_retries
+    times before the gap is filled with fallback questions.
+    
+    When on_token is given the response is streamed and each token is passed
+    to it as it arrives; the parsed questions are still returned at the end.
+    Setting cancel_event stops the generation early and returns None.
+    """
+    assistant = assistant or st.session_state.assistant
+    assistant.count("requests")
+    
+    stored = assistant.library.get("practice_questions", topic, disabilities, difficulty)
+    if stored is not None:
+        questions = [item for item in json.loads(stored) if is_valid_practice_question(item)]
+        if len(questions) >= count:
+            return questions[:count]
+    
+    questions = []
+    
+    def check(text):
+        # Only answers the model really wrote come here, so this counts model calls
+        assistant.count("generations")
+        try:
+            items = parse_practice_questions(text)
+        except ValueError:
+            return False
+        return bool(items) and all(is_valid_practice_question(item) for item in items)
+    
+    for attempt in range(max_retries + 1):
+        missing = count - len(questions)
+        if missing <= 0:
+            break
+        if attempt:
+            assistant.count("retries")
+        
+        system, prompt = practice_questions_prompt(
+            topic, difficulty, disabilities, missing, [q["question"] for q in questions]
+        )
+        
+        try:
+            tokens = assistant.generate(
+                assistant.select_model("practice_questions"),
+                prompt,
+                options={"temperature": 0.7},
+                stream=bool(on_token or cancel_event),
+                format=PRACTICE_QUESTIONS_SCHEMA,
+                task="practice_questions",
+                system=system,
+                disability=disability_label(disabilities),
+                # A retry must reach the model, not replay the answer that just failed
+                use_cache=not attempt,
+                check=check
+            )
             
-    except Exception as e:
-       print(f"Error generating questions: {e}")
-       # Fallback questions
-       return [
-           {
-               "question": f"Is {topic} something you enjoy learning about?",
-               "type": "yes_no",
-               "options": ["Yes! 😊", "No 😕"],
-               "correct_answer": "Yes! 😊",
-               "feedback": "That's okay! Let's make it more fun!",
-               "success_message": "Wonderful! Learning is always better when we enjoy it!"
-           },
-           {
-               "question": f"Can you name one thing about {topic}?",
-               "type": "multiple_choice",
-               "options": ["Yes, I can!", "I need help", "Maybe", "Not sure"],
-               "correct_answer": "Yes, I can!",
-               "feedback": "That's alright! Let's think together!",
-               "success_message": "Excellent thinking! You're doing great!"
-           },
-           {
-               "question": f"Would you like to learn more about {topic}?",
-               "type": "yes_no",
-               "options": ["Yes! 🎯", "Maybe later 😴"],
-               "correct_answer": "Yes! 🎯",
-               "feedback": "That's fine! We can learn when you're ready!",
-               "success_message": "That's the spirit! Keep being curious!"
-           }
-       ]
+            if isinstance(tokens, str):
+                response_text = tokens
+            else:
+                response_text = ""
+                for token in tokens:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return None
+                    response_text += token
+                    if on_token:
+                        on_token(token)
+        except Exception as e:
+            print(f"Error generating questions: {e}")
+            break
+        
+        try:
+            items = parse_practice_questions(response_text)
+        except ValueError as e:
+            print(f"Error parsing questions: {e}")
+            assistant.count("parse_failures")
+            continue
+        
+        valid = [item for item in items if is_valid_practice_question(item)]
+        assistant.count("invalid_items", len(items) - len(valid))
+        questions.extend(valid[:missing])
+    
+    if len(questions) < count:
+        assistant.count("fallbacks")
+        questions.extend(fallback_practice_questions(topic)[len(questions):count])
+    
+    return questions
+
+def fallback_practice_questions(topic):
+    """Encouraging questions used when the model's output can't be used"""
+    return [
+        {
+            "question": f"Is {topic} something you enjoy learning about?",
+            "type": "yes_no",
+            "options": ["Yes! 😊", "No 😕"],
+            "correct_answer": "Yes! 😊",
+            "feedback": "That's okay! Let's make it more fun!",
+            "success_message": "Wonderful! Learning is always better when we enjoy it!"
+        },
+        {
+            "question": f"Can you name one thing about {topic}?",
+            "type": "multiple_choice",
+            "options": ["Yes, I can!", "I need help", "Maybe", "Not sure"],
+            "correct_answer": "Yes, I can!",
+            "feedback": "That's alright! Let's think together!",
+            "success_message": "Excellent thinking! You're doing great!"
+        },
+        {
+            "question": f"Would you like to learn more about {topic}?",
+            "type": "yes_no",
+            "options": ["Yes! 🎯", "Maybe later 😴"],
+            "correct_answer": "Yes! 🎯",
+            "feedback": "That's fine! We can learn when you're ready!",
+            "success_message": "That's the spirit! Keep being curious!"
+        }
+    ]
 
 def display_practice_interface():
    """Display interactive practice questions"""
@@ -1029,9 +4085,9 @@ def progress_tracker_tab():
    """
    st.header("📊 My Learning Journey")
    
-   progress_history = load_progress_history()
+   summary = get_progress_store().summary(current_student_id())
    
-   if not progress_history:
+   if not summary:
        st.info("🌱 Your learning journey starts here! Complete some activities to see your progress.")
        
        with st.expander("🔮 Preview Your Future Progress"):
@@ -1045,59 +4101,37 @@ def progress_tracker_tab():
            """)
        return
    
-   df_data = []
-   for entry in progress_history:
-       date = datetime.fromisoformat(entry['timestamp'])
-       df_data.append({
-           'date': date.date(),
-           'weekday': date.strftime('%A'),
-           'topic': entry.get('topic', 'Unknown'),
-           'time_spent': entry.get('time_spent', 0),
-           'score': entry.get('quiz_score', None),
-           'activity': entry.get('activity_type', 'lesson')
-       })
-   
-   import pandas as pd
-   df = pd.DataFrame(df_data)
-   
    col1, col2, col3, col4 = st.columns(4)
    
    with col1:
-       total_time = df['time_spent'].sum()
-       st.metric("⏱️ Total Time", f"{total_time:.0f} min")
+       st.metric("⏱️ Total Time", f"{summary['total_time']:.0f} min")
    
    with col2:
-       total_activities = len(df)
-       st.metric("📚 Activities", total_activities)
+       st.metric("📚 Activities", summary['activities'])
    
    with col3:
-       avg_score = df[df['score'].notna()]['score'].mean() if any(df['score'].notna()) else 0
-       st.metric("📊 Avg Score", f"{avg_score:.0f}%")
+       st.metric("📊 Avg Score", f"{summary['avg_score'] or 0:.0f}%")
    
    with col4:
-       unique_topics = df['topic'].nunique()
-       st.metric("🌈 Topics", unique_topics)
+       st.metric("🌈 Topics", summary['unique_topics'])
    
    col1, col2 = st.columns(2)
    
    with col1:
        st.subheader("📈 Daily Learning Activity")
        
-       daily_data = df.groupby('date').agg({
-           'time_spent': 'sum',
-           'topic': 'count'
-       }).reset_index()
-       daily_data.columns = ['Date', 'Minutes', 'Activities']
+       days = [day for day, _, _ in summary['daily']]
+       minutes = [total for _, total, _ in summary['daily']]
        
        import plotly.graph_objects as go
        
        fig = go.Figure()
        fig.add_trace(go.Bar(
-           x=daily_data['Date'],
-           y=daily_data['Minutes'],
+           x=days,
+           y=minutes,
            name='Learning Time',
            marker_color='lightblue',
-           text=daily_data['Minutes'].round(1),
+           text=[round(total, 1) for total in minutes],
            textposition='outside'
        ))
        
@@ -1114,12 +4148,10 @@ def progress_tracker_tab():
    with col2:
        st.subheader("🎯 Learning by Topic")
        
-       topic_data = df.groupby('topic')['time_spent'].sum().sort_values(ascending=False).head(5)
-       
        fig2 = go.Figure(data=[
            go.Pie(
-               labels=topic_data.index,
-               values=topic_data.values,
+               labels=[topic for topic, _ in summary['top_topics']],
+               values=[total for _, total in summary['top_topics']],
                hole=.3,
                marker=dict(colors=['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8'])
            )
@@ -1135,7 +4167,7 @@ def progress_tracker_tab():
    st.markdown("---")
    st.subheader("🧠 Your Learning Insights")
    
-   insights = generate_learning_insights(df, st.session_state.assistant.student_profile)
+   insights = generate_learning_insights(summary, st.session_state.student_profile)
    
    cols = st.columns(3)  
    for i, insight in enumerate(insights[:3]):  
@@ -1148,14 +4180,14 @@ def progress_tracker_tab():
        with col:
            st.info(f"{insight['emoji']} **{insight['title']}**\n\n{insight['description']}")
    
-   streak = calculate_learning_streak(progress_history)
+   streak = summary['streak']
    if streak > 0:
        st.success(f"🔥 Learning Streak: {streak} days in a row! Keep it up!")
    
    st.markdown("---")
    st.subheader("💡 Personalized Recommendations")
    
-   recommendations = generate_recommendations(df, st.session_state.assistant.student_profile)
+   recommendations = generate_recommendations(summary, st.session_state.student_profile)
    for rec in recommendations:
        st.write(f"• {rec}")
    
@@ -1179,20 +4211,18 @@ def progress_tracker_tab():
                "status": "active"
            }
            
-           with open("learning_goals.json", "a") as f:
-               json.dump(goal_data, f)
-               f.write("\n")
+           get_progress_store().add_goal(goal_data, current_student_id())
            
            st.success("🎯 Goal set!")
            st.balloons()
 
-def generate_learning_insights(df, profile):
+def generate_learning_insights(summary, profile):
    """
    🤖 AI HELPS HERE: Analyzes data to generate personalized insights
    """
    insights = []
    
-   total_time = df['time_spent'].sum()
+   total_time = summary['total_time']
    if total_time > 60:
        hours = total_time / 60
        insights.append({
@@ -1201,7 +4231,7 @@ def generate_learning_insights(df, profile):
            "description": f"You've learned for {hours:.1f} hours total!"
        })
    
-   unique_days = df['date'].nunique()
+   unique_days = summary['unique_days']
    if unique_days > 5:
        insights.append({
            "emoji": "📅",
@@ -1209,17 +4239,16 @@ def generate_learning_insights(df, profile):
            "description": f"You've practiced on {unique_days} different days!"
        })
    
-   topics = df['topic'].unique()
-   if len(topics) > 3:
+   topics = summary['unique_topics']
+   if topics > 3:
        insights.append({
            "emoji": "🌈",
            "title": "Explorer",
-           "description": f"You've explored {len(topics)} different topics!"
+           "description": f"You've explored {topics} different topics!"
        })
    
-   quiz_scores = df[df['score'].notna()]['score']
-   if len(quiz_scores) > 0:
-       avg_score = quiz_scores.mean()
+   avg_score = summary['avg_score']
+   if avg_score is not None:
        if avg_score > 80:
            insights.append({
                "emoji": "🏆",
@@ -1229,19 +4258,19 @@ def generate_learning_insights(df, profile):
    
    return insights[:3]  
 
-def generate_recommendations(df, profile):
+def generate_recommendations(summary, profile):
    """
    🤖 AI HELPS HERE: Creates personalized learning recommendations
    """
    recommendations = []
    
-   avg_session_time = df['time_spent'].mean()
+   avg_session_time = summary['avg_session_time']
    if avg_session_time < 10:
        recommendations.append("🕒 Try longer learning sessions (15-20 minutes) for deeper understanding")
    
-   top_topics = df.groupby('topic')['time_spent'].sum().sort_values(ascending=False).head(3)
+   top_topics = summary['top_topics']
    if len(top_topics) > 0:
-       recommendations.append(f"💡 You enjoy {top_topics.index[0]} - explore related topics!")
+       recommendations.append(f"💡 You enjoy {top_topics[0][0]} - explore related topics!")
    
    if "ADHD" in profile.get("disabilities", []):
        recommendations.append("🎯 Remember to take breaks every 10 minutes")
@@ -1249,27 +4278,105 @@ def generate_recommendations(df, profile):
    if "Dyslexia" in profile.get("disabilities", []):
        recommendations.append("📖 Use the text simplifier for all reading materials")
    
-   recent_scores = df[df['score'].notna()].tail(3)['score']
-   if len(recent_scores) > 0 and recent_scores.mean() < 70:
+   recent_avg_score = summary['recent_avg_score']
+   if recent_avg_score is not None and recent_avg_score < 70:
        recommendations.append("📚 Review lessons before taking practice quizzes")
    
    return recommendations[:4]
 
-def calculate_learning_streak(history):
-   """Calculate consecutive learning days"""
-   if not history:
-       return 0
+def class_overview_tab():
+   """Teacher view: time on task, scores, trending topics and group comparisons for the whole class"""
+   st.header("👩‍🏫 Class Overview")
    
-   dates = sorted(set(datetime.fromisoformat(h['timestamp']).date() for h in history))
+   tables = get_class_analytics().tables()
    
-   streak = 1
-   for i in range(len(dates) - 1, 0, -1):
-       if (dates[i] - dates[i-1]).days == 1:
-           streak += 1
-       else:
-           break
+   if not tables:
+       st.info("🌱 No class activity yet. Charts appear once students start learning.")
+       return
+   
+   import plotly.graph_objects as go
+   
+   profiles = get_profile_store()
+   students = tables["students"]
+   
+   col1, col2, col3, col4 = st.columns(4)
+   
+   with col1:
+       st.metric("👥 Active Students", len(students))
+   
+   with col2:
+       st.metric("⏱️ Class Minutes", f"{students['minutes'].sum():.0f}")
+   
+   with col3:
+       class_score = students["avg_score"].mean()
+       st.metric("📊 Avg Score", f"{class_score:.0f}%" if class_score == class_score else "—")
+   
+   with col4:
+       st.metric("📚 Activities", int(students["activities"].sum()))
+   
+   col1, col2 = st.columns(2)
+   
+   with col1:
+       st.subheader("⏱️ Time on Task")
+       
+       daily = tables["daily"]
+       fig = go.Figure(go.Bar(x=daily["day"], y=daily["minutes"], marker_color='lightblue',
+                              customdata=daily["students"],
+                              hovertemplate="%{x}: %{y:.0f} min from %{customdata} students"))
+       fig.update_layout(xaxis_title="Date", yaxis_title="Minutes", height=300, showlegend=False)
+       st.plotly_chart(fig, use_container_width=True)
+   
+   with col2:
+       st.subheader("📊 Quiz Score Distribution")
+       
+       distribution = tables["score_distribution"]
+       fig = go.Figure(go.Bar(x=distribution["range"], y=distribution["quizzes"], marker_color='#4ECDC4'))
+       fig.update_layout(xaxis_title="Score (%)", yaxis_title="Quizzes", height=300, showlegend=False)
+       st.plotly_chart(fig, use_container_width=True)
+   
+   col1, col2 = st.columns(2)
+   
+   with col1:
+       st.subheader("📈 Trending Topics")
+       
+       trend = tables["topic_trend"]
+       fig = go.Figure([go.Scatter(x=trend.index, y=trend[topic], mode='lines+markers', name=topic)
+                        for topic in trend.columns])
+       fig.update_layout(xaxis_title="Date", yaxis_title="Minutes", height=300)
+       st.plotly_chart(fig, use_container_width=True)
+   
+   with col2:
+       st.subheader("🧩 Learning Needs Compared")
+       
+       groups = tables["disability_groups"]
+       fig = go.Figure([
+           go.Bar(x=groups["group"], y=groups["avg_score"], name="Avg score (%)"),
+           go.Bar(x=groups["group"], y=groups["avg_minutes"], name="Avg minutes per activity")
+       ])
+       fig.update_layout(barmode='group', height=300)
+       st.plotly_chart(fig, use_container_width=True)
+   
+   st.subheader("👥 Students")
+   
+   roster = students.assign(student=students["student_id"].map(profiles.name)).sort_values("minutes", ascending=False)
+   st.dataframe(
+       roster[["student", "minutes", "activities", "avg_score", "active_days", "streak", "last_day"]].round(1),
+       hide_index=True,
+       use_container_width=True
+   )
+   
+   st.caption(f"Aggregated {tables['rows']} activities in {tables['build_ms']} ms")
+
+def calculate_learning_streak(days):
+   """Calculate consecutive learning days from sorted, distinct ISO dates"""
+   if not days:
+       return 0
+   
+   dates = np.asarray(days, dtype="datetime64[D]")
+   breaks = np.flatnonzero(np.diff(dates) != np.timedelta64(1, "D"))
    
-   return streak
+   # The streak is everything after the last gap
+   return int(len(dates) - (breaks[-1] + 1 if len(breaks) else 0))
 
 def main():
    """Main application entry point"""
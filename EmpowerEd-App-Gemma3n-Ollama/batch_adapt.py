@@ -0,0 +1,169 @@
+"""
+Author: SURYA DEEP SINGH
+LinkedIn: https://www.linkedin.com/in/surya-deep-singh-b9b94813a/
+Medium: https://medium.com/@SuryaDeepSingh
+GitHub: https://github.com/SinghSuryaDeep
+
+Batch adaptation: prepare a week of reading material in one job.
+
+Every document is split into chunks at paragraph boundaries, and each chunk is
+adapted for every requested disability profile by a bounded pool of workers.
+Finished chunks are appended to <out>/progress.jsonl, so an interrupted job
+picks up where it stopped when run again with the same arguments.
+
+    python batch_adapt.py worksheets/ --profiles dyslexia adhd --out adapted/ --workers 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app import ADAPTATION_GUIDES, DISABILITY_OPTIONS, EmpowerEdAssistant, chunk_paragraphs
+
+DOCUMENT_EXTENSIONS = (".txt", ".md")
+PROGRESS_FILE = "progress.jsonl"
+# Profiles from the student profile that have their own adaptation rules, plus the general one
+PROFILES = [option.lower() for option in DISABILITY_OPTIONS if option.lower() in ADAPTATION_GUIDES] + ["general"]
+
+def find_documents(paths):
+    """Expand folders into the text documents they contain"""
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.lower().endswith(DOCUMENT_EXTENSIONS):
+                        documents.append(os.path.join(root, name))
+        else:
+            documents.append(path)
+    return documents
+
+def document_ids(documents):
+    """Give every document a unique, filesystem-friendly id"""
+    ids = {}
+    seen = {}
+    for path in documents:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        seen[stem] = seen.get(stem, 0) + 1
+        ids[path] = stem if seen[stem] == 1 else f"{stem}-{seen[stem]}"
+    return ids
+
+def load_finished(out_dir):
+    """Chunks adapted by earlier runs, keyed by (document id, profile, chunk index)"""
+    finished = {}
+    try:
+        with open(os.path.join(out_dir, PROGRESS_FILE), "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    finished[(entry["document"], entry["profile"], entry["chunk"])] = entry["text"]
+    except FileNotFoundError:
+        pass
+    return finished
+
+def run_batch(documents, profiles, out_dir, workers=4, max_chars=1500, assistant=None, cache_dir=None):
+    """Adapt every document for every profile and write one file per (document, profile).
+
+    The assistant's caches go in cache_dir, a fresh temporary folder by default.
+    Returns a summary with the throughput in chunks per minute.
+    """
+    assistant = assistant or EmpowerEdAssistant(cache_dir=cache_dir or tempfile.mkdtemp(prefix="empowered-batch-"))
+    # The client allows only a couple of requests per model at once; give every worker its own
+    assistant.client.allow_in_flight(workers)
+    os.makedirs(out_dir, exist_ok=True)
+
+    ids = document_ids(documents)
+    chunks = {}
+    for path in documents:
+        with open(path, "r", encoding="utf-8") as f:
+            chunks[ids[path]] = chunk_paragraphs(f.read(), max_chars)
+
+    finished = load_finished(out_dir)
+    pending = [
+        (doc_id, profile, index)
+        for doc_id, doc_chunks in chunks.items()
+        for profile in profiles
+        for index in range(len(doc_chunks))
+        if (doc_id, profile, index) not in finished
+    ]
+    total = sum(len(doc_chunks) for doc_chunks in chunks.values()) * len(profiles)
+    print(f"📚 {len(documents)} documents, {total} chunks, {total - len(pending)} already done")
+
+    progress_lock = threading.Lock()
+    failures = 0
+    start = time.time()
+
+    def adapt(job):
+        doc_id, profile, index = job
+        return assistant.adaptive_text_processing(chunks[doc_id][index], profile)
+
+    with open(os.path.join(out_dir, PROGRESS_FILE), "a") as progress, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(adapt, job): job for job in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            doc_id, profile, index = futures[future]
+            try:
+                text = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"❌ {doc_id} [{profile}] chunk {index + 1}: {e}")
+                continue
+
+            finished[(doc_id, profile, index)] = text
+            with progress_lock:
+                json.dump({"document": doc_id, "profile": profile, "chunk": index, "text": text}, progress)
+                progress.write("\n")
+                progress.flush()
+            print(f"✅ {done}/{len(pending)} {doc_id} [{profile}] chunk {index + 1}")
+
+    elapsed = time.time() - start
+    adapted = len(pending) - failures
+
+    written = 0
+    for doc_id, doc_chunks in chunks.items():
+        for profile in profiles:
+            parts = [finished.get((doc_id, profile, index)) for index in range(len(doc_chunks))]
+            if all(part is not None for part in parts):
+                with open(os.path.join(out_dir, f"{doc_id}.{profile}.md"), "w", encoding="utf-8") as f:
+                    f.write("\n\n".join(parts))
+                written += 1
+
+    summary = {
+        "documents": len(documents),
+        "profiles": list(profiles),
+        "chunks_adapted": adapted,
+        "chunks_failed": failures,
+        "outputs_written": written,
+        "seconds": round(elapsed, 1),
+        "chunks_per_minute": round(adapted / elapsed * 60, 1) if elapsed > 0 else 0.0
+    }
+    print(f"🏁 {adapted} chunks in {elapsed:.1f}s ({summary['chunks_per_minute']} chunks/minute), "
+          f"{failures} failed, {written} files written to {out_dir}")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Adapt a set of documents for several learning profiles")
+    parser.add_argument("paths", nargs="+", help="documents or folders of .txt/.md files")
+    parser.add_argument("--profiles", nargs="+", type=str.lower, choices=PROFILES,
+                        default=["dyslexia", "adhd", "autism"],
+                        help=f"disability profiles to adapt for ({', '.join(PROFILES)})")
+    parser.add_argument("--out", default="adapted", help="output folder")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests to Ollama (set OLLAMA_NUM_PARALLEL at least as high)")
+    parser.add_argument("--max-chars", type=int, default=1500, help="maximum characters per chunk")
+    parser.add_argument("--cache-dir", help="folder for the response caches (default: a new temporary folder)")
+    args = parser.parse_args()
+
+    run_batch(
+        find_documents(args.paths),
+        list(dict.fromkeys(args.profiles)),
+        args.out,
+        workers=args.workers,
+        max_chars=args.max_chars,
+        cache_dir=args.cache_dir
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Author: SURYA DEEP SINGH
+LinkedIn: https://www.linkedin.com/in/surya-deep-singh-b9b94813a/
+Medium: https://medium.com/@SuryaDeepSingh
+GitHub: https://github.com/SinghSuryaDeep
+
+Latency and throughput benchmark for every EmpowerEdAssistant task.
+
+Each task (adaptation per disability profile, combined adaptation, lesson,
+visual guide, image guide, comprehension and practice JSON) is run several
+times with streaming on. Per task it records p50/p95 latency, p50/p95 time to
+first token, generation tokens/sec and, for practice questions, the rate of
+responses that failed to parse.
+
+Run it against a real Ollama, or with --fake against a built-in
+deterministic stand-in that streams fixed text at a fixed pace, so numbers
+can be compared across commits without a GPU:
+
+    python benchmark.py --fake --runs 5 --json before.json
+    python benchmark.py --runs 3 --accurate-model empowered-gemma-3n-2b-q4 --json q4.json
+    python benchmark.py --fake --json after.json --compare before.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SAMPLE_TEXT = (
+    "The water cycle describes how water moves around the Earth. Water evaporates from oceans "
+    "and lakes, rises into the sky and cools into clouds. When the clouds get heavy the water "
+    "falls back down as rain or snow, and rivers carry it back to the sea."
+)
+
+FAKE_WORDS = "Here is a short and friendly answer that helps the student learn step by step .".split()
+
+FAKE_QUESTION = {
+    "question": "What makes clouds?",
+    "type": "multiple_choice",
+    "options": ["Cooling water vapour", "Sand", "Rocks", "Wind"],
+    "correct_answer": "Cooling water vapour",
+    "feedback": "Try again! Hint: think about the sky.",
+    "success_message": "Great job! You got it!"
+}
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Deterministic stand-in for the Ollama endpoints the app uses"""
+
+    token_seconds = 0.005
+    first_token_seconds = 0.05
+    tokens = 40
+    bad_json_every = 0
+    json_requests = 0
+    lock = threading.Lock()
+    loaded = set()
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+    def do_GET(self):
+        if self.path.endswith("/api/ps"):
+            self._reply({"models": [
+                {"name": model, "model": model, "size": 0, "digest": "", "details": {},
+                 "expires_at": "2100-01-01T00:00:00Z", "size_vram": 0}
+                for model in sorted(self.loaded)
+            ]})
+        else:
+            self._reply({"models": []})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        chat = self.path.endswith("/api/chat")
+        self.loaded.add(request["model"])
+
+        if self.path.endswith("/api/embed"):
+            # Bag-of-words vector, so texts sharing words are similar
+            vector = [0.0] * 64
+            for word in re.findall(r"\w+", str(request["input"]).lower()):
+                vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+            self._reply({"model": request["model"], "embeddings": [vector]})
+            return
+
+        if not request.get("prompt") and not request.get("messages"):
+            self._reply({"model": request["model"], "response": "", "done": True})
+            return
+
+        pieces = [word + " " for word in FAKE_WORDS * (self.tokens // len(FAKE_WORDS) + 1)][:self.tokens]
+        if request.get("format"):
+            with self.lock:
+                FakeOllamaHandler.json_requests += 1
+                bad = self.bad_json_every and FakeOllamaHandler.json_requests % self.bad_json_every == 0
+            text = json.dumps({"questions": [FAKE_QUESTION] * 3})
+            pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+            if bad:
+                pieces = pieces[:len(pieces) // 2]
+
+        prompt_chars = len(request.get("system", "")) + len(request.get("prompt", "")) + sum(
+            len(message["content"]) for message in request.get("messages", [])
+        )
+        final = {
+            "total_duration": int((self.first_token_seconds + len(pieces) * self.token_seconds) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": prompt_chars // 4,
+            "prompt_eval_duration": int(self.first_token_seconds * 1e9),
+            "eval_count": len(pieces),
+            "eval_duration": int(len(pieces) * self.token_seconds * 1e9)
+        }
+
+        def chunk(text, done):
+            body = {"model": request["model"], "created_at": "2025-01-01T00:00:00Z", "done": done}
+            if chat:
+                body["message"] = {"role": "assistant", "content": text}
+            else:
+                body["response"] = text
+            if done:
+                body.update(final, done_reason="stop")
+            return body
+
+        time.sleep(self.first_token_seconds)
+        if not request.get("stream", True):
+            time.sleep(len(pieces) * self.token_seconds)
+            self._reply(chunk("".join(pieces), True))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for piece in pieces:
+            self.wfile.write((json.dumps(chunk(piece, False)) + "\n").encode())
+            self.wfile.flush()
+            time.sleep(self.token_seconds)
+        self.wfile.write((json.dumps(chunk("", True)) + "\n").encode())
+
+def start_fake_ollama(token_ms, first_token_ms, tokens, bad_json_every):
+    """Serve the fake on a free local port and return its URL"""
+    FakeOllamaHandler.token_seconds = token_ms / 1000
+    FakeOllamaHandler.first_token_seconds = first_token_ms / 1000
+    FakeOllamaHandler.tokens = tokens
+    FakeOllamaHandler.bad_json_every = bad_json_every
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def sample_image():
+    """A fixed picture of shapes so image tasks are repeatable"""
+    pixels = np.full((480, 640, 3), 255, dtype=np.uint8)
+    pixels[60:220, 60:220] = (220, 60, 60)
+    pixels[260:420, 360:580] = (60, 120, 220)
+    return Image.fromarray(pixels)
+
+def build_tasks(app, assistant, image):
+    """Task name -> function taking on_token and returning the full text"""
+    def streamed(tokens, on_token):
+        text = ""
+        for token in tokens:
+            on_token(token)
+            text += token
+        return text
+
+    tasks = {}
+    for disability in app.ADAPTATION_GUIDES:
+        tasks[f"adapt:{disability}"] = lambda on_token, disability=disability: streamed(
+            assistant.adaptive_text_processing(SAMPLE_TEXT, disability, stream=True), on_token
+        )
+
+    tasks["adapt:combined"] = lambda on_token: streamed(
+        assistant.combined_text_processing(SAMPLE_TEXT, ["Dyslexia", "ADHD"], stream=True), on_token
+    )
+    tasks["lesson"] = lambda on_token: streamed(
+        assistant.multi_sensory_lesson("the water cycle", ["Dyslexia", "ADHD"], stream=True), on_token
+    )
+    tasks["visual_guide"] = lambda on_token: streamed(
+        assistant.create_visual_learning_content(
+            "A red square and a blue rectangle on a white page", "shapes and colors", stream=True
+        ),
+        on_token
+    )
+    tasks["image_guide"] = lambda on_token: streamed(
+        assistant.visual_learning_aid(image, "shapes and colors", stream=True, mode="single"), on_token
+    )
+    tasks["comprehension"] = lambda on_token: streamed(
+        assistant.generate_comprehension_questions(SAMPLE_TEXT, stream=True), on_token
+    )
+    tasks["practice_json"] = lambda on_token: json.dumps(app.generate_practice_questions(
+        "the water cycle", "Easy", ["Dyslexia"], on_token=on_token, assistant=assistant, max_retries=0
+    ))
+    return tasks
+
+def percentile(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 1) if samples else None
+
+def run_task(assistant, fn, runs):
+    latencies, first_tokens, speeds = [], [], []
+    failures_before = assistant.practice_metrics["parse_failures"] + assistant.practice_metrics["invalid_items"]
+    generations_before = assistant.practice_metrics["generations"]
+    errors = 0
+
+    for _ in range(runs):
+        # Every run must reach the model, not the response cache or the vision memo
+        assistant.response_cache.clear()
+        assistant.semantic_cache.clear()
+        assistant.vision_memo.clear()
+        log_start = len(assistant.budgets.log)
+        first_token = []
+        start = time.perf_counter()
+
+        def on_token(token):
+            if not first_token:
+                first_token.append(time.perf_counter() - start)
+
+        try:
+            fn(on_token)
+        except Exception as e:
+            errors += 1
+            print(f"  ❌ {e}")
+            continue
+
+        latencies.append(time.perf_counter() - start)
+        if first_token:
+            first_tokens.append(first_token[0])
+        speeds.extend(entry["tokens_per_second"] for entry in assistant.budgets.log[log_start:]
+                      if entry["tokens_per_second"])
+
+    generations = assistant.practice_metrics["generations"] - generations_before
+    failures = (assistant.practice_metrics["parse_failures"] + assistant.practice_metrics["invalid_items"]
+                - failures_before)
+    return {
+        "runs": runs,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "ttft_p50_ms": percentile(first_tokens, 50),
+        "ttft_p95_ms": percentile(first_tokens, 95),
+        "tokens_per_second": round(statistics.mean(speeds), 1) if speeds else None,
+        "parse_failure_rate": round(failures / generations, 3) if generations else None
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+
+    print(f"\n📊 Compared with {baseline_path} ({baseline.get('commit')})")
+    for task, now in results["tasks"].items():
+        before = baseline.get("tasks", {}).get(task)
+        if not before:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms", "ttft_p50_ms"):
+            if now[metric] is not None and before.get(metric):
+                changes.append(f"{metric} {now[metric] - before[metric]:+.1f} "
+                               f"({(now[metric] / before[metric] - 1) * 100:+.0f}%)")
+        print(f"  {task:22s} " + ", ".join(changes))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every EmpowerEd task against Ollama")
+    parser.add_argument("--runs", type=int, default=5, help="repetitions per task")
+    parser.add_argument("--tasks", nargs="+", help="only run these tasks")
+    parser.add_argument("--fake", action="store_true", help="use the built-in deterministic Ollama stand-in")
+    parser.add_argument("--fake-token-ms", type=float, default=5, help="fake: delay between tokens")
+    parser.add_argument("--fake-first-token-ms", type=float, default=50, help="fake: delay before the first token")
+    parser.add_argument("--fake-tokens", type=int, default=40, help="fake: tokens per text answer")
+    parser.add_argument("--fake-bad-json-every", type=int, default=0,
+                        help="fake: truncate every Nth JSON answer to exercise parse failures")
+    parser.add_argument("--fast-model", help="override the fast model")
+    parser.add_argument("--accurate-model", help="override the accurate (fine-tuned) model")
+    parser.add_argument("--vision-model", help="override the vision model")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="print changes against an earlier results file")
+    args = parser.parse_args()
+
+    if args.fake:
+        os.environ["OLLAMA_HOST"] = start_fake_ollama(
+            args.fake_token_ms, args.fake_first_token_ms, args.fake_tokens, args.fake_bad_json_every
+        )
+
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    assistant = app.EmpowerEdAssistant()
+    cache_dir = tempfile.mkdtemp()
+    assistant.response_cache = app.ResponseCache(path=os.path.join(cache_dir, "benchmark_cache.db"))
+    assistant.semantic_cache = app.SemanticCache(
+        assistant.semantic_cache.embed,
+        path=os.path.join(cache_dir, "benchmark_semantic.db"),
+        thresholds=assistant.semantic_cache.thresholds
+    )
+    # An empty library, so lessons and practice questions built overnight don't answer instead of the model
+    assistant.library = app.LessonLibrary(path=os.path.join(cache_dir, "benchmark_library.db"))
+    for role in ("fast", "accurate", "vision"):
+        override = getattr(args, f"{role}_model")
+        if override:
+            original = getattr(assistant, f"{role}_model")
+            setattr(assistant, f"{role}_model", override)
+            assistant.task_models = {
+                task: tuple(override if model == original else model for model in models)
+                for task, models in assistant.task_models.items()
+            }
+
+    tasks = build_tasks(app, assistant, sample_image())
+    if args.tasks:
+        tasks = {name: fn for name, fn in tasks.items() if name in args.tasks}
+
+    results = {
+        "commit": git_commit(),
+        "target": "fake" if args.fake else os.environ.get("OLLAMA_HOST", "http://localhost:11434"),
+        "models": {
+            "fast": assistant.fast_model,
+            "accurate": assistant.accurate_model,
+            "vision": assistant.vision_model
+        },
+        "runs": args.runs,
+        "tasks": {}
+    }
+
+    print(f"⏱️ EmpowerEd benchmark against {results['target']}")
+    for name, fn in tasks.items():
+        results["tasks"][name] = run_task(assistant, fn, args.runs)
+        print(f"  {name:22s} {results['tasks'][name]}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
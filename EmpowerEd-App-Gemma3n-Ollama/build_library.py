@@ -0,0 +1,145 @@
+"""
+Author: SURYA DEEP SINGH
+LinkedIn: https://www.linkedin.com/in/surya-deep-singh-b9b94813a/
+Medium: https://medium.com/@SuryaDeepSingh
+GitHub: https://github.com/SinghSuryaDeep
+
+Lesson library: prepare a curriculum's lessons overnight.
+
+For every topic, disability combination and difficulty level, a pool of
+worker processes generates the multi-sensory lesson, its practice questions
+and comprehension questions on the lesson, and the results go into
+lesson_library.db. At class time the app serves these with one lookup and
+only generates live on a miss. Entries already in the library are skipped,
+so an interrupted run picks up where it stopped.
+
+    python build_library.py --topics "numbers 1-10" colors emotions animals --max-needs 2 --workers 2
+"""
+import argparse
+import json
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+
+from app import (DISABILITY_OPTIONS, LESSON_DIFFICULTIES, STARTER_TOPICS, EmpowerEdAssistant, LessonLibrary,
+                 generate_practice_questions)
+
+_assistant = None
+
+def start_worker(path):
+    """Give each worker process its own assistant, Ollama connection and caches"""
+    global _assistant
+    # The app's caches in the working directory must not be opened by every worker at once
+    _assistant = EmpowerEdAssistant(cache_dir=tempfile.mkdtemp(prefix="empowered-build-"))
+    _assistant.library = LessonLibrary(path)
+    # Library content must be freshly written, not reused from similar earlier requests
+    _assistant.response_cache.cache_sampled = False
+
+def needs_combinations(disabilities, max_needs):
+    """Every combination of up to max_needs disabilities, including none at all"""
+    return [list(combo) for size in range(max_needs + 1) for combo in combinations(disabilities, size)]
+
+def build_entry(topic, needs, difficulty, kinds, lesson=None):
+    """Generate the missing kinds of content for one (topic, needs, difficulty)"""
+    content = {}
+    if lesson is None:
+        lesson = _assistant.multi_sensory_lesson(topic, needs, difficulty=difficulty)
+        content["lesson"] = lesson
+
+    if "practice_questions" in kinds:
+        fallbacks = _assistant.practice_metrics["fallbacks"]
+        questions = generate_practice_questions(topic, difficulty, needs, assistant=_assistant)
+        # Placeholder questions are better generated live than stored for good
+        if _assistant.practice_metrics["fallbacks"] == fallbacks:
+            content["practice_questions"] = json.dumps(questions)
+
+    if "comprehension_questions" in kinds:
+        content["comprehension_questions"] = _assistant.generate_comprehension_questions(lesson)
+
+    return content
+
+def run_library(topics, disabilities, difficulties, path="lesson_library.db", max_needs=None, workers=2):
+    """Fill the library and return a summary with the throughput in entries per minute"""
+    library = LessonLibrary(path)
+    stored = library.keys()
+    combos = needs_combinations(disabilities, len(disabilities) if max_needs is None else max_needs)
+
+    jobs = []
+    for topic in topics:
+        for needs in combos:
+            for difficulty in difficulties:
+                kinds = [kind for kind in LessonLibrary.KINDS
+                         if library.key(kind, topic, needs, difficulty) not in stored]
+                if kinds:
+                    lesson = None if "lesson" in kinds else library.get("lesson", topic, needs, difficulty)
+                    jobs.append((topic, needs, difficulty, kinds, lesson))
+
+    total = len(topics) * len(combos) * len(difficulties)
+    print(f"📚 {len(topics)} topics × {len(combos)} needs combinations × {len(difficulties)} levels: "
+          f"{total} lessons, {total - len(jobs)} already complete")
+
+    written = 0
+    failures = 0
+    start = time.time()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=start_worker,
+                             initargs=(path,)) as pool:
+        futures = {pool.submit(build_entry, *job): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), 1):
+            topic, needs, difficulty, _, _ = futures[future]
+            label = f"{topic} [{', '.join(needs) or 'general'} · {difficulty}]"
+            try:
+                content = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"❌ {label}: {e}")
+                continue
+
+            for kind, text in content.items():
+                library.put(kind, topic, needs, difficulty, text)
+            written += len(content)
+            print(f"✅ {done}/{len(jobs)} {label}")
+
+    elapsed = time.time() - start
+    summary = {
+        "topics": len(topics),
+        "needs_combinations": len(combos),
+        "difficulties": list(difficulties),
+        "entries_written": written,
+        "lessons_failed": failures,
+        "seconds": round(elapsed, 1),
+        "entries_per_minute": round(written / elapsed * 60, 1) if elapsed > 0 else 0.0
+    }
+    print(f"🏁 {written} entries in {elapsed:.1f}s ({summary['entries_per_minute']} entries/minute), "
+          f"{failures} lessons failed, {library.stats()['entries']} entries in {path}")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate lessons and questions for the lesson library")
+    parser.add_argument("--topics", nargs="+", default=STARTER_TOPICS, help="lesson topics")
+    parser.add_argument("--topics-file", help="file with one topic per line, added to --topics")
+    parser.add_argument("--disabilities", nargs="+", default=DISABILITY_OPTIONS,
+                        help="disabilities to combine (as named in the student profile)")
+    parser.add_argument("--max-needs", type=int, help="most disabilities in one combination (default: all)")
+    parser.add_argument("--difficulties", nargs="+", default=LESSON_DIFFICULTIES, help="difficulty levels")
+    parser.add_argument("--library", default="lesson_library.db", help="library database")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes")
+    args = parser.parse_args()
+
+    topics = list(args.topics)
+    if args.topics_file:
+        with open(args.topics_file, "r", encoding="utf-8") as f:
+            topics += [line.strip() for line in f if line.strip()]
+
+    run_library(
+        list(dict.fromkeys(topics)),
+        args.disabilities,
+        args.difficulties,
+        path=args.library,
+        max_needs=args.max_needs,
+        workers=args.workers
+    )
+
+if __name__ == "__main__":
+    main()
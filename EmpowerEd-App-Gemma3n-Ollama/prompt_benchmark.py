@@ -0,0 +1,103 @@
+"""
+Author: SURYA DEEP SINGH
+LinkedIn: https://www.linkedin.com/in/surya-deep-singh-b9b94813a/
+Medium: https://medium.com/@SuryaDeepSingh
+GitHub: https://github.com/SinghSuryaDeep
+
+Prompt-eval benchmark: inline prompts versus prefix-stable templates.
+
+Adapts a handful of different texts for each profile twice: once with the
+old inline prompt layout (the student's text in the middle of the
+instructions) and once with the template registry (fixed system prefix, text
+last). For every call it records Ollama's prompt_eval_count and
+prompt_eval_duration, so the saving from prefix reuse shows up directly.
+
+    python prompt_benchmark.py --model gemma3n:e2b --profiles dyslexia adhd --json prompts.json
+"""
+import argparse
+import json
+import statistics
+
+import ollama
+
+from app import ADAPTATION_GUIDES, adaptation_prompt, parse_keep_alive
+
+SAMPLE_TEXTS = [
+    "Photosynthesis is the process plants use to turn sunlight, water and carbon dioxide into food.",
+    "The water cycle moves water from oceans to clouds to rain and back to the oceans again.",
+    "Fractions describe parts of a whole, like one slice out of a pizza cut into eight pieces.",
+    "Volcanoes form where melted rock from deep inside the Earth pushes up through the crust.",
+    "Bees help flowers make seeds by carrying pollen from one flower to another."
+]
+
+def inline_prompt(disability, text):
+    """The prompt layout used before templates, with the text between the instructions"""
+    guide = ADAPTATION_GUIDES[disability]
+    rules = "\n".join(f"            {i}. {rule}" for i, rule in enumerate(guide["rules"], 1))
+    return None, f"""
+            {guide["intro"]}
+{rules}
+
+            {guide["label"]}: {text}
+
+            {guide["closing"]}
+            """
+
+def run_layout(client, model, layout, profiles, texts, keep_alive):
+    samples = []
+    for profile in profiles:
+        for text in texts:
+            system, prompt = layout(profile, text)
+            request = {"model": model, "prompt": prompt, "keep_alive": keep_alive,
+                       # Only the prompt evaluation matters here, so stop after one token
+                       "options": {"temperature": 0, "num_predict": 1}}
+            if system:
+                request["system"] = system
+            response = client.generate(**request)
+            samples.append({
+                "profile": profile,
+                "tokens": response["prompt_eval_count"] or 0,
+                "ms": (response["prompt_eval_duration"] or 0) / 1e6
+            })
+
+    return {
+        "calls": len(samples),
+        "mean_prompt_eval_ms": round(statistics.mean(sample["ms"] for sample in samples), 1),
+        "median_prompt_eval_ms": round(statistics.median(sample["ms"] for sample in samples), 1),
+        "mean_prompt_tokens": round(statistics.mean(sample["tokens"] for sample in samples), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare prompt-eval time of inline and template prompts")
+    parser.add_argument("--model", default="gemma3n:e2b", help="model to benchmark")
+    parser.add_argument("--profiles", nargs="+", default=["dyslexia", "adhd", "autism"],
+                        help="disability profiles to adapt for")
+    parser.add_argument("--keep-alive", default="10m", help="keep_alive sent with every call")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    client = ollama.Client()
+    keep_alive = parse_keep_alive(args.keep_alive)
+    # Load the model first so neither layout pays for it
+    client.generate(model=args.model, prompt="", keep_alive=keep_alive)
+
+    results = {
+        "model": args.model,
+        "profiles": args.profiles,
+        "inline": run_layout(client, args.model, inline_prompt, args.profiles, SAMPLE_TEXTS, keep_alive),
+        "template": run_layout(
+            client, args.model, lambda profile, text: adaptation_prompt([profile], text),
+            args.profiles, SAMPLE_TEXTS, keep_alive
+        )
+    }
+
+    print(f"📝 Prompt eval on {args.model}")
+    for layout in ("inline", "template"):
+        print(f"  {layout:9s} {results[layout]}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Author: SURYA DEEP SINGH
+LinkedIn: https://www.linkedin.com/in/surya-deep-singh-b9b94813a/
+Medium: https://medium.com/@SuryaDeepSingh
+GitHub: https://github.com/SinghSuryaDeep
+
+Startup benchmark for the EmpowerEd app.
+
+Measures how long a fresh interpreter takes to import app.py (what every
+Streamlit server start pays) and how long a new session takes to construct
+EmpowerEdAssistant. With --eager-audio it also times the audio setup the app
+used to do at startup (pyttsx3.init + sr.Microphone) for comparison.
+
+    python startup_benchmark.py --runs 5 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import app; "
+    "print(time.perf_counter() - start)"
+)
+
+def summarize(samples):
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1)
+    }
+
+def time_cold_import(runs):
+    """Import app.py in a fresh interpreter each run"""
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET],
+            cwd=APP_DIR,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return summarize(samples)
+
+def time_session_start(runs):
+    """Construct EmpowerEdAssistant the way every new browser session does"""
+    sys.path.insert(0, APP_DIR)
+    import app
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        app.EmpowerEdAssistant()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def time_eager_audio(runs):
+    """Time the audio setup that used to run on every startup"""
+    import pyttsx3
+    import speech_recognition as sr
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        try:
+            pyttsx3.init()
+            sr.Microphone()
+        except Exception as e:
+            return {"error": f"audio backend unavailable: {e}"}
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure EmpowerEd cold start time")
+    parser.add_argument("--runs", type=int, default=5, help="repetitions per measurement")
+    parser.add_argument("--eager-audio", action="store_true",
+                        help="also time eager pyttsx3/microphone initialization")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    os.chdir(APP_DIR)
+    results = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "tts_driver": os.environ.get("EMPOWERED_TTS_DRIVER", "default"),
+        "cold_import": time_cold_import(args.runs),
+        "session_start": time_session_start(args.runs)
+    }
+    if args.eager_audio:
+        results["eager_audio"] = time_eager_audio(args.runs)
+
+    print("🚀 EmpowerEd startup benchmark")
+    for name in ("cold_import", "session_start", "eager_audio"):
+        if name in results:
+            print(f"  {name:15s} {results[name]}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()